@@ -6,7 +6,8 @@ from planetarium.models import (
     AstronomyShow,
     ShowSession,
     Ticket,
-    Reservation
+    Reservation,
+    SeatHold
 )
 admin.site.register(ShowTheme)
 admin.site.register(PlanetariumDome)
@@ -14,3 +15,4 @@ admin.site.register(AstronomyShow)
 admin.site.register(ShowSession)
 admin.site.register(Ticket)
 admin.site.register(Reservation)
+admin.site.register(SeatHold)
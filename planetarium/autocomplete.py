@@ -0,0 +1,162 @@
+import re
+import threading
+import time
+from bisect import bisect_left
+
+from django.core.cache import cache
+
+from planetarium.models import AstronomyShow, ShowTheme
+
+KINDS = {
+    "astronomy_show": (AstronomyShow, "title"),
+    "show_theme": (ShowTheme, "name"),
+}
+
+CHANGES_KEY = "planetarium:autocomplete:changes"
+
+
+def normalize(text):
+    return " ".join(re.findall(r"\w+", text.casefold()))
+
+
+class PrefixIndex:
+    """
+    Labels kept as sorted (key, kind, id) entries, once for the whole
+    label and once from every later word on, so the matches of a prefix
+    are one contiguous, alphabetical run found with bisect
+    """
+
+    def __init__(self):
+        self.labels = {}
+        self.starts = []
+        self.words = []
+
+    @staticmethod
+    def entries(kind, pk, label):
+        words = normalize(label).split()
+        start = [(" ".join(words), kind, pk)] if words else []
+        later = [
+            (" ".join(words[position:]), kind, pk)
+            for position in range(1, len(words))
+        ]
+        return start, later
+
+    @classmethod
+    def build(cls, labels):
+        """Indexes (kind, pk, label) triples, sorting the entries once"""
+        index = cls()
+        for kind, pk, label in labels:
+            index.labels[kind, pk] = label
+            start, later = cls.entries(kind, pk, label)
+            index.starts.extend(start)
+            index.words.extend(later)
+        index.starts.sort()
+        index.words.sort()
+        return index
+
+    def add(self, kind, pk, label):
+        self.remove(kind, pk)
+        self.labels[kind, pk] = label
+        start, later = self.entries(kind, pk, label)
+        for entries, new_entries in ((self.starts, start), (self.words, later)):
+            for entry in new_entries:
+                entries.insert(bisect_left(entries, entry), entry)
+
+    def remove(self, kind, pk):
+        label = self.labels.pop((kind, pk), None)
+        if label is None:
+            return
+        start, later = self.entries(kind, pk, label)
+        for entries, old_entries in ((self.starts, start), (self.words, later)):
+            for entry in old_entries:
+                position = bisect_left(entries, entry)
+                if position < len(entries) and entries[position] == entry:
+                    del entries[position]
+
+    def search(self, prefix, limit):
+        """Labels starting with `prefix` first, then labels with a word that does"""
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+
+        matches = []
+        seen = set()
+        for entries in (self.starts, self.words):
+            position = bisect_left(entries, (prefix,))
+            while (
+                len(matches) < limit
+                and position < len(entries)
+                and entries[position][0].startswith(prefix)
+            ):
+                _, kind, pk = entries[position]
+                if (kind, pk) not in seen:
+                    seen.add((kind, pk))
+                    matches.append(
+                        {"type": kind, "id": pk, "label": self.labels[kind, pk]}
+                    )
+                position += 1
+        return matches
+
+
+class Autocomplete:
+    """
+    The prefix index of this process. Every committed label change, in
+    any process, increments a shared counter. A change made here is
+    applied incrementally when it is the only one since the index was
+    last current, any other count rebuilds the index. Other processes
+    are only noticed through a cache they share, see CACHES in settings,
+    with a local-memory cache every process only follows its own changes.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.index = None
+        self.changes = None
+
+    @staticmethod
+    def current_changes():
+        # a counter evicted from the cache restarts at the current time,
+        # away from the counts indexes were built at
+        return cache.get_or_set(CHANGES_KEY, time.time_ns, timeout=None)
+
+    @staticmethod
+    def count_change():
+        """Returns the count of this change, None when the counter was lost"""
+        cache.add(CHANGES_KEY, time.time_ns(), timeout=None)
+        try:
+            return cache.incr(CHANGES_KEY)
+        except ValueError:
+            return None
+
+    def build(self):
+        return PrefixIndex.build(
+            (kind, pk, label)
+            for kind, (model, field) in KINDS.items()
+            for pk, label in model.objects.values_list("pk", field)
+        )
+
+    def search(self, prefix, limit=10):
+        changes = self.current_changes()
+        with self.lock:
+            if self.index is None or self.changes != changes:
+                self.index = self.build()
+                self.changes = changes
+            return self.index.search(prefix, limit)
+
+    def update(self, kind, pk, label=None):
+        """Adds or replaces a label, or removes it when `label` is None"""
+        with self.lock:
+            changes = self.count_change()
+            if self.index is None:
+                return
+            if changes is None or changes != self.changes + 1:
+                # this index missed another change, the next search rebuilds
+                return
+            if label is None:
+                self.index.remove(kind, pk)
+            else:
+                self.index.add(kind, pk, label)
+            self.changes = changes
+
+
+autocomplete_index = Autocomplete()
@@ -0,0 +1,79 @@
+import asyncio
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import lru_cache
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+def show_session_channel(show_session_id):
+    return f"show_session:{show_session_id}"
+
+
+class Subscription:
+    """Messages of one channel for a listener running on an event loop"""
+
+    def __init__(self, loop, maxsize):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize)
+        # set once the listener fell too far behind, it missed messages
+        self.overflowed = False
+
+    def put(self, message):
+        """Called on the loop of the listener"""
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def get(self):
+        return await self.queue.get()
+
+
+class InProcessBroker:
+    """
+    Fans messages out to the subscribers of a channel within this process.
+    Publishing is thread safe and never blocks on slow listeners.
+    """
+
+    def __init__(self, queue_size=None):
+        self.queue_size = queue_size or settings.SEAT_EVENTS_QUEUE_SIZE
+        self._subscriptions = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def publish(self, channel, message):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(channel, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.put, message)
+            except RuntimeError:
+                # the loop of the listener is closed
+                pass
+
+    @contextmanager
+    def subscribe(self, channel):
+        """Must be entered from the event loop the messages are read on"""
+        subscription = Subscription(
+            asyncio.get_running_loop(), self.queue_size
+        )
+        with self._lock:
+            self._subscriptions[channel].add(subscription)
+        try:
+            yield subscription
+        finally:
+            with self._lock:
+                self._subscriptions[channel].discard(subscription)
+                if not self._subscriptions[channel]:
+                    del self._subscriptions[channel]
+
+    def subscribers(self, channel):
+        with self._lock:
+            return len(self._subscriptions.get(channel, ()))
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    return import_string(settings.SEAT_EVENTS_BROKER)()
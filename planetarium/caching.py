@@ -0,0 +1,109 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.functional import cached_property
+from django.utils.http import (
+    http_date,
+    parse_etags,
+    parse_http_date_safe,
+    quote_etag,
+    urlencode
+)
+from rest_framework import status
+from rest_framework.response import Response
+
+from planetarium.versions import (
+    collection_version,
+    get_versions,
+    object_version
+)
+
+
+class VersionedViewMixin:
+    """
+    Version stamps of the data behind list and retrieve responses: the
+    stamp of the whole collection for lists, of the object for details
+    """
+
+    def get_version_names(self):
+        model = self.queryset.model
+        if self.action == "retrieve":
+            return [object_version(model, self.kwargs[self.lookup_field])]
+        return [collection_version(model)]
+
+    @cached_property
+    def version_stamps(self):
+        return get_versions(*self.get_version_names())
+
+    def get_representation_key(self, request):
+        params = urlencode(sorted(request.query_params.lists()), doseq=True)
+        key = (
+            f"{request.get_host()}{request.path}?{params}:"
+            f"{request.accepted_media_type}:{self.version_stamps}"
+        )
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def versioned_response(self, handler, request, *args, **kwargs):
+        return handler(request, *args, **kwargs)
+
+    def list(self, request, *args, **kwargs):
+        return self.versioned_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.versioned_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+
+class ConditionalGetMixin(VersionedViewMixin):
+    """
+    Adds ETag and Last-Modified headers to list and retrieve responses and
+    answers If-None-Match / If-Modified-Since with 304 before any query
+    """
+
+    def versioned_response(self, handler, request, *args, **kwargs):
+        etag = quote_etag(self.get_representation_key(request)[:32])
+        last_modified = max(self.version_stamps) // 10**9
+        headers = {"ETag": etag, "Last-Modified": http_date(last_modified)}
+
+        if_none_match = request.headers.get("If-None-Match")
+        if_modified_since = parse_http_date_safe(
+            request.headers.get("If-Modified-Since")
+        )
+        if if_none_match:
+            etags = parse_etags(if_none_match)
+            not_modified = "*" in etags or etag in etags
+        else:
+            not_modified = bool(
+                if_modified_since and last_modified <= if_modified_since
+            )
+        if not_modified:
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        response = super().versioned_response(handler, request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            for header, value in headers.items():
+                response[header] = value
+        return response
+
+
+class CachedResponseMixin(VersionedViewMixin):
+    """
+    Caches list and retrieve responses per URL and query params. Keys hold
+    the version stamps, so bumping a version makes every response built
+    from the old data unreachable.
+    """
+
+    cache_timeout = settings.RESPONSE_CACHE_TIMEOUT
+
+    def versioned_response(self, handler, request, *args, **kwargs):
+        key = f"planetarium:response:{self.get_representation_key(request)}"
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+
+        response = super().versioned_response(handler, request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(key, response.data, self.cache_timeout)
+        return response
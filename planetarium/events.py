@@ -0,0 +1,122 @@
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import (
+    HttpResponse,
+    HttpResponseNotAllowed,
+    JsonResponse,
+    StreamingHttpResponse
+)
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from planetarium.broadcast import get_broker, show_session_channel
+from planetarium.models import ShowSession
+
+
+def places(places):
+    return [{"row": row, "seat": seat} for row, seat in places]
+
+
+def seats_changed_message(show_session_id, taken, released):
+    return {
+        "show_session": show_session_id,
+        "taken": places(taken),
+        "released": places(released),
+    }
+
+
+def server_sent_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def authenticate(request):
+    try:
+        user_auth = JWTAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return None
+    return user_auth and user_auth[0]
+
+
+def taken_seats(show_session_id):
+    show_session = ShowSession.objects.get(pk=show_session_id)
+    return places(show_session.taken_seats())
+
+
+def seat_snapshot(show_session_id):
+    """
+    The taken seats as a single event, with a retry interval so the client
+    reconnects for the next snapshot instead of waiting for changes
+    """
+    retry = int(settings.SEAT_EVENTS_KEEPALIVE * 1000)
+    return f"retry: {retry}\n" + server_sent_event(
+        "snapshot", {"taken": taken_seats(show_session_id)}
+    )
+
+
+async def seat_events(show_session_id):
+    """
+    Sends the taken seats, then the seats_changed deltas. Subscribing
+    before the snapshot is read means no committed change is missed.
+    Streams end after SEAT_EVENTS_MAX_AGE seconds: a client that went
+    away is not noticed, and the client that is still there reconnects
+    for a fresh snapshot.
+    """
+    loop = asyncio.get_running_loop()
+    closes_at = loop.time() + settings.SEAT_EVENTS_MAX_AGE
+    with get_broker().subscribe(
+        show_session_channel(show_session_id)
+    ) as subscription:
+        taken = await sync_to_async(taken_seats)(show_session_id)
+        yield server_sent_event("snapshot", {"taken": taken})
+
+        while not subscription.overflowed:
+            remaining = closes_at - loop.time()
+            if remaining <= 0:
+                yield "retry: 1000\n\n"
+                return
+            try:
+                message = await asyncio.wait_for(
+                    subscription.get(),
+                    min(settings.SEAT_EVENTS_KEEPALIVE, remaining)
+                )
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            yield server_sent_event("seats", message)
+
+        # the client fell behind, it reconnects for a fresh snapshot
+        yield server_sent_event("reset", {})
+
+
+async def show_session_events(request, pk):
+    """Server-sent events with the seats taken and released in a show session"""
+    if request.method != "GET":
+        return HttpResponseNotAllowed(["GET"])
+
+    user = await sync_to_async(authenticate)(request)
+    if user is None or not user.is_active:
+        return JsonResponse(
+            {"detail": "Authentication credentials were not provided."},
+            status=401
+        )
+    if not await ShowSession.objects.filter(pk=pk).aexists():
+        return JsonResponse({"detail": "Not found."}, status=404)
+
+    if isinstance(request, ASGIRequest):
+        response = StreamingHttpResponse(
+            seat_events(pk), content_type="text/event-stream"
+        )
+    else:
+        # a WSGI server only sends a stream once it ends, so the client
+        # polls for snapshots rather than holding a worker thread forever
+        response = HttpResponse(
+            await sync_to_async(seat_snapshot)(pk),
+            content_type="text/event-stream"
+        )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
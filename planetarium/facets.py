@@ -0,0 +1,60 @@
+from collections import defaultdict
+
+from django.core.cache import cache
+
+from planetarium.models import AstronomyShow, ShowTheme
+from planetarium.versions import collection_version, get_versions
+
+THEME_MEMBERSHIP = collection_version(AstronomyShow.show_themes.through)
+
+
+def theme_membership_key(version):
+    return f"planetarium:theme-membership:{version}"
+
+
+class ThemeMembership:
+    """Theme names and the ids of the astronomy shows of every theme"""
+
+    def __init__(self, names, members):
+        self.names = names
+        self.members = members
+
+    @classmethod
+    def build(cls):
+        memberships = AstronomyShow.show_themes.through.objects.values_list(
+            "showtheme_id", "astronomyshow_id"
+        )
+        members = defaultdict(set)
+        for theme_id, show_id in memberships:
+            members[theme_id].add(show_id)
+        return cls(
+            dict(ShowTheme.objects.values_list("id", "name")),
+            {theme_id: frozenset(shows) for theme_id, shows in members.items()}
+        )
+
+    @classmethod
+    def get(cls):
+        """Returns the cached membership, built again after every change"""
+        [version] = get_versions(THEME_MEMBERSHIP)
+        key = theme_membership_key(version)
+        membership = cache.get(key)
+        if membership is None:
+            membership = cls.build()
+            cache.set(key, membership)
+        return membership
+
+    def counts(self, show_ids=None):
+        """
+        Shows of every theme among `show_ids` (all shows when None), the
+        most common themes first
+        """
+        facets = []
+        for theme_id, name in self.names.items():
+            shows = self.members.get(theme_id, frozenset())
+            if show_ids is not None:
+                shows = shows & show_ids
+            facets.append({"id": theme_id, "name": name, "count": len(shows)})
+        facets.sort(
+            key=lambda facet: (-facet["count"], facet["name"], facet["id"])
+        )
+        return facets
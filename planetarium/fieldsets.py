@@ -0,0 +1,38 @@
+from django.utils.functional import cached_property
+from rest_framework.exceptions import ValidationError
+
+
+class SparseFieldsMixin:
+    """
+    `?fields=id,title` limits list and retrieve responses to the given
+    fields. QueryPlanMixin plans the queryset for these fields alone.
+    """
+
+    sparse_actions = ("list", "retrieve")
+
+    @cached_property
+    def sparse_serializer(self):
+        return self.get_serializer_class()(context=self.get_serializer_context())
+
+    @cached_property
+    def sparse_fields(self):
+        fields = self.request.query_params.get("fields")
+        if self.action not in self.sparse_actions or not fields:
+            return None
+
+        fields = {field.strip() for field in fields.split(",") if field.strip()}
+        unknown = fields - set(self.sparse_serializer.fields)
+        if unknown:
+            raise ValidationError(
+                {"fields": f"Unknown fields: {', '.join(sorted(unknown))}"}
+            )
+        return fields
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        if self.sparse_fields is not None:
+            fields = getattr(serializer, "child", serializer).fields
+            for name in list(fields):
+                if name not in self.sparse_fields:
+                    fields.pop(name)
+        return serializer
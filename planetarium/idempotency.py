@@ -0,0 +1,78 @@
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction, IntegrityError
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.response import Response
+
+from planetarium.models import IdempotencyKey
+
+
+class IdempotencyKeyInUse(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "A request with this Idempotency-Key is in progress."
+    default_code = "idempotency_key_in_use"
+
+
+class IdempotencyKeyReused(APIException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = "This Idempotency-Key was used with a different request."
+    default_code = "idempotency_key_reused"
+
+
+def request_hash(data):
+    payload = json.dumps(data, sort_keys=True, cls=DjangoJSONEncoder)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class IdempotentCreateMixin:
+    """
+    Stores the response of `create` under the Idempotency-Key header for
+    IDEMPOTENCY_KEY_HOURS and replays it to retries of the same request
+    """
+
+    def create(self, request, *args, **kwargs):
+        header = request.headers.get("Idempotency-Key")
+        if not header:
+            return super().create(request, *args, **kwargs)
+
+        key = IdempotencyKey.make_key(request.user, header)
+        fingerprint = request_hash(request.data)
+
+        stored = IdempotencyKey.objects.filter(pk=key).first()
+        if stored and not stored.is_expired:
+            if stored.request_hash != fingerprint:
+                raise IdempotencyKeyReused()
+            return Response(
+                stored.response_data,
+                status=stored.response_status,
+                headers={"Idempotent-Replayed": "true"},
+            )
+
+        with transaction.atomic():
+            if stored:
+                stored.delete()
+            try:
+                # claims the key, concurrent retries wait here and then fail
+                with transaction.atomic():
+                    IdempotencyKey.objects.create(
+                        key=key,
+                        user=request.user,
+                        request_hash=fingerprint,
+                        expires_at=timezone.now()
+                        + timedelta(hours=settings.IDEMPOTENCY_KEY_HOURS),
+                    )
+            except IntegrityError:
+                raise IdempotencyKeyInUse()
+
+            response = super().create(request, *args, **kwargs)
+            IdempotencyKey.objects.filter(pk=key).update(
+                response_status=response.status_code,
+                response_data=response.data,
+            )
+        return response
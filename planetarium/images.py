@@ -0,0 +1,156 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from io import BytesIO
+
+from PIL import Image, ImageOps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+
+from planetarium.models import AstronomyShow, ShowSession
+from planetarium.versions import bump_objects
+
+logger = logging.getLogger(__name__)
+
+# bounding boxes, images are scaled down to fit and never up
+VARIANTS = {
+    "thumbnail": (200, 200),
+    "card": (640, 400),
+    "hero": (1600, 900),
+}
+
+FORMATS = {
+    "webp": ("WEBP", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", {"quality": 85, "optimize": True, "progressive": True}),
+}
+
+
+def image_storage():
+    return AstronomyShow._meta.get_field("image").storage
+
+
+def variant_name(image_name, variant, extension):
+    stem, _ = os.path.splitext(os.path.basename(image_name))
+    return os.path.join(
+        "uploads/images/variants/", f"{stem}-{variant}.{extension}"
+    )
+
+
+def encode(image, image_format, options):
+    if image_format == "JPEG" and image.mode != "RGB":
+        image = image.convert("RGB")
+    buffer = BytesIO()
+    image.save(buffer, image_format, **options)
+    return buffer.getvalue()
+
+
+def render_variants(image_name):
+    """
+    Writes every variant of a stored image in every format and returns
+    their storage names as {variant: {extension: name}}
+    """
+    storage = image_storage()
+    with storage.open(image_name) as file, Image.open(file) as original:
+        original = ImageOps.exif_transpose(original)
+        has_alpha = (
+            "A" in original.getbands() or "transparency" in original.info
+        )
+        original = original.convert("RGBA" if has_alpha else "RGB")
+
+        files = {}
+        for variant, size in VARIANTS.items():
+            image = original.copy()
+            image.thumbnail(size, Image.Resampling.LANCZOS)
+            files[variant] = {}
+            for extension, (image_format, options) in FORMATS.items():
+                name = variant_name(image_name, variant, extension)
+                # storages pick another name rather than overwrite
+                if storage.exists(name):
+                    storage.delete(name)
+                files[variant][extension] = storage.save(
+                    name, ContentFile(encode(image, image_format, options))
+                )
+    return files
+
+
+def delete_variants(image_variants):
+    storage = image_storage()
+    for files in image_variants.get("files", {}).values():
+        for name in files.values():
+            storage.delete(name)
+
+
+def generate_variants(astronomy_show_id, force=False):
+    """
+    Renders the variants of the current image of a show and records them,
+    unless they are recorded already
+    """
+    astronomy_show = AstronomyShow.objects.filter(
+        pk=astronomy_show_id
+    ).only("image", "image_variants").first()
+    if astronomy_show is None:
+        return
+    source = astronomy_show.image.name or None
+    if not force and astronomy_show.image_variants.get("source") == source:
+        return
+
+    image_variants = {}
+    if source is not None:
+        image_variants = {"source": source, "files": render_variants(source)}
+
+    # the image may have been replaced meanwhile, its own job records it
+    updated = AstronomyShow.objects.filter(
+        pk=astronomy_show_id, image=astronomy_show.image.name
+    ).update(image_variants=image_variants)
+    if not updated:
+        delete_variants(image_variants)
+        return
+
+    replaced = astronomy_show.image_variants
+    if replaced.get("source") != source:
+        delete_variants(replaced)
+    # update() sends no post_save, so do what the receivers do
+    bump_objects(AstronomyShow, [astronomy_show_id])
+    bump_objects(
+        ShowSession,
+        ShowSession.objects.filter(
+            astronomy_show_id=astronomy_show_id
+        ).values_list("id", flat=True)
+    )
+
+
+def run_generate_variants(astronomy_show_id):
+    try:
+        generate_variants(astronomy_show_id)
+    except Exception:
+        logger.exception(
+            "Image variants of astronomy show %s failed", astronomy_show_id
+        )
+    finally:
+        # connections are per thread, pool threads open their own
+        connections.close_all()
+
+
+@lru_cache
+def get_executor():
+    return ThreadPoolExecutor(
+        max_workers=settings.IMAGE_VARIANT_WORKERS,
+        thread_name_prefix="image-variants"
+    )
+
+
+def generate_variants_on_commit(astronomy_show_id):
+    """
+    Renders the variants in a pool thread once the transaction commits,
+    Pillow releases the GIL while resizing and encoding
+    """
+    if settings.IMAGE_VARIANT_WORKERS == 0:
+        transaction.on_commit(lambda: generate_variants(astronomy_show_id))
+    else:
+        transaction.on_commit(
+            lambda: get_executor().submit(
+                run_generate_variants, astronomy_show_id
+            )
+        )
@@ -0,0 +1,157 @@
+import logging
+import time
+
+from django.db import connection, DatabaseError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.response import Response
+from rest_framework.reverse import reverse
+
+from planetarium.locks import ShowSessionBusy
+from planetarium.models import ReservationRequest
+from planetarium.serializers import (
+    ReservationSerializer,
+    ReservationIntakeSerializer,
+    ReservationRequestSerializer
+)
+
+logger = logging.getLogger(__name__)
+
+
+class ReservationIntakeMixin:
+    """
+    With a `Prefer: respond-async` header `create` only checks the shape of
+    the reservation, queues it and answers 202 with a status URL
+    """
+
+    def create(self, request, *args, **kwargs):
+        if request.headers.get("Prefer") != "respond-async":
+            return super().create(request, *args, **kwargs)
+
+        serializer = ReservationIntakeSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        reservation_request = ReservationRequest.objects.create(
+            user=request.user, payload=serializer.data
+        )
+
+        status_url = reverse(
+            "planetarium:reservationrequest-detail",
+            args=[reservation_request.id],
+            request=request,
+        )
+        data = ReservationRequestSerializer(reservation_request).data
+        data["url"] = status_url
+        return Response(
+            data,
+            status=status.HTTP_202_ACCEPTED,
+            headers={"Location": status_url},
+        )
+
+
+def save_outcome(reservation_request, status, errors=None, reservation=None):
+    reservation_request.status = status
+    reservation_request.errors = errors
+    reservation_request.reservation = reservation
+    reservation_request.processed_at = timezone.now()
+    reservation_request.save(
+        update_fields=("status", "errors", "reservation", "processed_at")
+    )
+
+
+def process_request(reservation_request):
+    serializer = ReservationSerializer(data=reservation_request.payload)
+    try:
+        with transaction.atomic():
+            serializer.is_valid(raise_exception=True)
+            reservation = serializer.save(user=reservation_request.user)
+    except ShowSessionBusy:
+        raise
+    except APIException as error:
+        save_outcome(
+            reservation_request,
+            ReservationRequest.Status.REJECTED,
+            errors=(
+                error.detail
+                if isinstance(error, ValidationError)
+                else {"detail": error.detail}
+            ),
+        )
+    else:
+        save_outcome(
+            reservation_request,
+            ReservationRequest.Status.CONFIRMED,
+            reservation=reservation,
+        )
+
+
+def process_next(skipped):
+    """
+    Claims the oldest pending request not in `skipped` and processes it
+    in a transaction of its own. Returns the request, None when there is
+    none left.
+    """
+    with transaction.atomic():
+        reservation_request = (
+            ReservationRequest.objects.filter(
+                status=ReservationRequest.Status.PENDING
+            )
+            .exclude(pk__in=skipped)
+            .select_related("user")
+            .select_for_update(skip_locked=True, of=("self",))
+            .order_by("created_at")
+            .first()
+        )
+        if reservation_request is None:
+            return None
+        try:
+            with transaction.atomic():
+                process_request(reservation_request)
+        except ShowSessionBusy:
+            # stays pending for a later batch
+            skipped.add(reservation_request.pk)
+        except Exception:
+            # rejected rather than left pending, where it would fail
+            # every later batch
+            logger.exception(
+                "Reservation request %s failed", reservation_request.pk
+            )
+            save_outcome(
+                reservation_request,
+                ReservationRequest.Status.REJECTED,
+                errors={"detail": "This reservation could not be processed."},
+            )
+    return reservation_request
+
+
+def process_batch(batch_size=50):
+    """
+    Processes up to `batch_size` pending requests, oldest first, and
+    commits each one on its own. Returns how many requests were processed.
+    """
+    processed = 0
+    skipped = set()
+    while processed + len(skipped) < batch_size:
+        reservation_request = process_next(skipped)
+        if reservation_request is None:
+            break
+        if reservation_request.pk not in skipped:
+            processed += 1
+    return processed
+
+
+def drain(batch_size=50, once=False, interval=1.0):
+    """Worker loop, with `once` it returns as soon as the queue is empty"""
+    while True:
+        try:
+            if process_batch(batch_size):
+                continue
+        except DatabaseError:
+            if once:
+                raise
+            # the database went away, try again with a new connection
+            logger.exception("Reservation requests could not be processed")
+            connection.close()
+        if once:
+            return
+        time.sleep(interval)
@@ -0,0 +1,88 @@
+import threading
+from collections import defaultdict
+from contextlib import contextmanager, ExitStack
+
+from django.conf import settings
+from django.db import connection, OperationalError, transaction
+from django.db.transaction import TransactionManagementError
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+# first key of the two-key advisory locks, keeps them apart from other users
+ADVISORY_LOCK_NAMESPACE = 0x504C4E54
+
+_local_locks = defaultdict(threading.Lock)
+_local_locks_guard = threading.Lock()
+
+
+class ShowSessionBusy(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "This show session is busy, please try again."
+    default_code = "show_session_busy"
+
+
+class ShowSessionSoldOut(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "This show session is sold out."
+    default_code = "show_session_sold_out"
+
+
+@contextmanager
+def _advisory_lock(show_session_id, timeout):
+    # a lock timeout aborts only the savepoint, and with it the local
+    # lock_timeout, the lock itself is released when the transaction ends
+    try:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute("SELECT current_setting('lock_timeout')")
+            (lock_timeout,) = cursor.fetchone()
+            cursor.execute(
+                "SELECT set_config('lock_timeout', %s, true)",
+                [f"{int(timeout * 1000)}ms"],
+            )
+            cursor.execute(
+                "SELECT pg_advisory_xact_lock(%s, %s)",
+                [ADVISORY_LOCK_NAMESPACE, show_session_id % 2**31],
+            )
+            cursor.execute(
+                "SELECT set_config('lock_timeout', %s, true)", [lock_timeout]
+            )
+    except OperationalError:
+        raise ShowSessionBusy()
+    yield
+
+
+@contextmanager
+def _local_lock(show_session_id, timeout):
+    with _local_locks_guard:
+        lock = _local_locks[show_session_id]
+    if not lock.acquire(timeout=timeout):
+        raise ShowSessionBusy()
+    try:
+        yield
+    finally:
+        lock.release()
+
+
+@contextmanager
+def show_session_locks(show_session_ids, timeout=None):
+    """
+    Serializes bookings of the given show sessions. Locks are taken in id
+    order so overlapping bookings cannot deadlock, and a booking that waits
+    longer than BOOKING_LOCK_TIMEOUT seconds fails with ShowSessionBusy.
+    Enter it inside the transaction of the booking: on Postgres the
+    advisory locks are held until that transaction ends, so a booking
+    waiting for them sees the seats of the previous one. Other databases
+    fall back to locks local to this process, released on exit.
+    """
+    if not connection.in_atomic_block:
+        raise TransactionManagementError(
+            "show_session_locks() must be used inside a transaction."
+        )
+    if timeout is None:
+        timeout = settings.BOOKING_LOCK_TIMEOUT
+    lock = _advisory_lock if connection.vendor == "postgresql" else _local_lock
+
+    with ExitStack() as stack:
+        for show_session_id in sorted(set(show_session_ids)):
+            stack.enter_context(lock(show_session_id, timeout))
+        yield
@@ -0,0 +1,55 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from planetarium.images import generate_variants
+from planetarium.models import AstronomyShow
+
+
+def generate(astronomy_show_id, force):
+    try:
+        generate_variants(astronomy_show_id, force=force)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = (
+        "Renders the resized variants of astronomy show images uploaded "
+        "before variants existed, or whose rendering failed"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=4,
+            help="Number of threads resizing images",
+        )
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Render the variants of every image again",
+        )
+
+    def handle(self, *args, **options):
+        show_ids = list(
+            AstronomyShow.objects.exclude(image="").exclude(
+                image__isnull=True
+            ).order_by("id").values_list("id", flat=True)
+        )
+
+        if options["workers"] == 1:
+            for show_id in show_ids:
+                generate_variants(show_id, force=options["all"])
+        else:
+            with ThreadPoolExecutor(max_workers=options["workers"]) as pool:
+                for _ in pool.map(
+                    generate, show_ids, [options["all"]] * len(show_ids)
+                ):
+                    pass
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(show_ids)} astronomy show image(s) processed"
+        ))
@@ -0,0 +1,57 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from planetarium.intake import drain
+
+
+class Command(BaseCommand):
+    help = "Drains the queue of asynchronous reservation requests"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Number of worker processes",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=50,
+            help="Requests a worker processes between checks of the queue",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=1.0,
+            help="Seconds to wait when the queue is empty",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit as soon as the queue is empty",
+        )
+
+    def handle(self, *args, **options):
+        worker_options = (
+            options["batch_size"],
+            options["once"],
+            options["interval"],
+        )
+
+        if options["workers"] == 1:
+            drain(*worker_options)
+        else:
+            # every worker process has to open its own connection
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=options["workers"]) as pool:
+                workers = [
+                    pool.submit(drain, *worker_options)
+                    for _ in range(options["workers"])
+                ]
+                for worker in workers:
+                    worker.result()
+
+        self.stdout.write(self.style.SUCCESS("Reservation queue drained"))
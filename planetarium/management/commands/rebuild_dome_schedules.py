@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from planetarium.models import DomeSchedule, ShowSession
+from planetarium.schedules import refresh_schedules, show_session_days
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the per-day schedule documents of planetarium domes"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dome",
+            type=int,
+            action="append",
+            help="Only rebuild the schedules of this dome, can be repeated",
+        )
+
+    def handle(self, *args, **options):
+        show_sessions = ShowSession.objects.all()
+        schedules = DomeSchedule.objects.all()
+        if options["dome"]:
+            show_sessions = show_sessions.filter(
+                planetarium_dome__in=options["dome"]
+            )
+            schedules = schedules.filter(planetarium_dome__in=options["dome"])
+
+        # days without sessions are dropped by the refresh
+        days = show_session_days(show_sessions) | set(
+            schedules.values_list("planetarium_dome_id", "date")
+        )
+        refresh_schedules(days)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(days)} schedule day(s) rebuilt"
+        ))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from planetarium.models import AstronomyShow
+from planetarium.search import index_astronomy_shows
+
+
+class Command(BaseCommand):
+    help = (
+        "Reindexes astronomy shows for full-text search, after changes "
+        "that bypassed model signals such as queryset updates"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of shows indexed per statement",
+        )
+
+    def handle(self, *args, **options):
+        show_ids = list(
+            AstronomyShow.objects.order_by("id").values_list("id", flat=True)
+        )
+        batch_size = options["batch_size"]
+        for start in range(0, len(show_ids), batch_size):
+            index_astronomy_shows(show_ids[start:start + batch_size])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(show_ids)} astronomy show(s) indexed"
+        ))
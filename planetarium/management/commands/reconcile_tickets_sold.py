@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from planetarium.models import ShowSession, Ticket
+from planetarium.schedules import refresh_schedules, show_session_days
+from planetarium.versions import bump_objects
+
+
+class Command(BaseCommand):
+    help = "Recounts sold tickets for show sessions whose counter drifted"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report show sessions with a wrong counter",
+        )
+
+    def handle(self, *args, **options):
+        sold = Coalesce(
+            Subquery(
+                Ticket.objects.filter(show_session=OuterRef("pk"))
+                .order_by()
+                .values("show_session")
+                .annotate(count=Count("pk"))
+                .values("count")
+            ),
+            Value(0),
+        )
+        drifted = (
+            ShowSession.objects.annotate(actual_sold=sold)
+            .exclude(tickets_sold=F("actual_sold"))
+            .values_list("id", "tickets_sold", "actual_sold")
+        )
+
+        fixed = 0
+        for show_session_id, tickets_sold, actual_sold in list(drifted):
+            self.stdout.write(
+                f"Show session {show_session_id}: "
+                f"counted {tickets_sold}, sold {actual_sold}"
+            )
+            if not options["dry_run"]:
+                ShowSession.objects.filter(pk=show_session_id).update(
+                    tickets_sold=sold
+                )
+                bump_objects(ShowSession, [show_session_id])
+                refresh_schedules(
+                    show_session_days(
+                        ShowSession.objects.filter(pk=show_session_id)
+                    )
+                )
+            fixed += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{fixed} show session(s) out of sync"
+        ))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from planetarium.models import SeatHold
+
+
+class Command(BaseCommand):
+    help = "Deletes expired seat holds in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of holds deleted per statement",
+        )
+
+    def handle(self, *args, **options):
+        swept = SeatHold.sweep_expired(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"{swept} expired hold(s) swept"))
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.4 on 2026-10-18 01:45
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_tickets_sold(apps, schema_editor):
+    ShowSession = apps.get_model("planetarium", "ShowSession")
+    Ticket = apps.get_model("planetarium", "Ticket")
+    sold = (
+        Ticket.objects.order_by()
+        .values_list("show_session")
+        .annotate(count=Count("pk"))
+    )
+    for show_session_id, count in sold:
+        ShowSession.objects.filter(pk=show_session_id).update(tickets_sold=count)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("planetarium", "0003_astronomyshow_image"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="showsession",
+            name="tickets_sold",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_tickets_sold, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="showsession",
+            index=models.Index(
+                fields=["planetarium_dome", "tickets_sold"],
+                name="planetarium_planeta_805e5c_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.4 on 2026-10-18 01:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("planetarium", "0006_idempotencykey"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="showsession",
+            name="high_contention",
+            field=models.BooleanField(default=False),
+        ),
+    ]
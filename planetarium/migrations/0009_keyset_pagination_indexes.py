@@ -0,0 +1,25 @@
+# Generated by Django 4.2.4 on 2026-10-18 01:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("planetarium", "0008_reservationrequest"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="reservation",
+            index=models.Index(
+                fields=["user", "created_at", "id"],
+                name="planetarium_user_id_6ada56_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="showsession",
+            index=models.Index(
+                fields=["show_time", "id"], name="planetarium_show_ti_f16619_idx"
+            ),
+        ),
+    ]
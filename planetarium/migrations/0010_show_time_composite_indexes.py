@@ -0,0 +1,26 @@
+# Generated by Django 4.2.4 on 2026-10-18 01:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("planetarium", "0009_keyset_pagination_indexes"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="showsession",
+            index=models.Index(
+                fields=["planetarium_dome", "show_time"],
+                name="planetarium_planeta_8d0702_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="showsession",
+            index=models.Index(
+                fields=["astronomy_show", "show_time"],
+                name="planetarium_astrono_7e5570_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.4 on 2026-10-18 02:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("planetarium", "0011_domeschedule"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="astronomyshow",
+            name="duration",
+            field=models.PositiveIntegerField(default=60),
+        ),
+    ]
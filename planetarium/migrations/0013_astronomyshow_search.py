@@ -0,0 +1,73 @@
+from django.db import migrations
+
+# a copy of planetarium.search as of this migration
+
+POSTGRES_DOCUMENT = """
+    setweight(to_tsvector('english', astronomy_show.title), 'A')
+    || setweight(to_tsvector('english', astronomy_show.description), 'B')
+    || setweight(to_tsvector('english', coalesce((
+        SELECT string_agg(theme.name, ' ')
+        FROM planetarium_showtheme theme
+        JOIN planetarium_astronomyshow_show_themes show_theme
+            ON show_theme.showtheme_id = theme.id
+        WHERE show_theme.astronomyshow_id = astronomy_show.id
+    ), '')), 'C')
+"""
+
+SQLITE_THEMES = """
+    coalesce((
+        SELECT group_concat(theme.name, ' ')
+        FROM planetarium_showtheme theme
+        JOIN planetarium_astronomyshow_show_themes show_theme
+            ON show_theme.showtheme_id = theme.id
+        WHERE show_theme.astronomyshow_id = astronomy_show.id
+    ), '')
+"""
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        schema_editor.execute(
+            "ALTER TABLE planetarium_astronomyshow ADD COLUMN search_vector tsvector"
+        )
+        schema_editor.execute(
+            f"UPDATE planetarium_astronomyshow astronomy_show "
+            f"SET search_vector = {POSTGRES_DOCUMENT}"
+        )
+        schema_editor.execute(
+            "CREATE INDEX planetarium_astronomyshow_search_idx "
+            "ON planetarium_astronomyshow USING GIN (search_vector)"
+        )
+    elif vendor == "sqlite":
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE planetarium_astronomyshow_fts USING fts5("
+            "title, description, themes, tokenize = 'porter unicode61')"
+        )
+        schema_editor.execute(
+            f"INSERT INTO planetarium_astronomyshow_fts "
+            f"(rowid, title, description, themes) "
+            f"SELECT astronomy_show.id, astronomy_show.title, "
+            f"astronomy_show.description, {SQLITE_THEMES} "
+            f"FROM planetarium_astronomyshow astronomy_show"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        schema_editor.execute(
+            "ALTER TABLE planetarium_astronomyshow DROP COLUMN search_vector"
+        )
+    elif vendor == "sqlite":
+        schema_editor.execute("DROP TABLE planetarium_astronomyshow_fts")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("planetarium", "0012_astronomyshow_duration"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.4 on 2026-10-18 02:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("planetarium", "0013_astronomyshow_search"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="astronomyshow",
+            name="image_variants",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.4 on 2026-10-18 02:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("planetarium", "0014_astronomyshow_image_variants"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="astronomyshow",
+            name="show_themes",
+            field=models.ManyToManyField(
+                blank=True, related_name="astronomy_shows", to="planetarium.showtheme"
+            ),
+        ),
+    ]
@@ -1,11 +1,17 @@
+import hashlib
 import os
 import uuid
 
 from django.conf import settings
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, connection
+from django.db.models import Count, Exists, F, OuterRef, Value
+from django.utils import timezone
 from django.utils.text import slugify
 
+from planetarium.signals import send_seats_changed
+
 
 def image_path_file(instance, filename):
     _, extension = os.path.splitext(filename)
@@ -22,6 +28,25 @@ class ShowTheme(models.Model):
         return self.name
 
 
+class AstronomyShowQuerySet(models.QuerySet):
+    def with_themes(self, theme_ids, match_all=False):
+        """Shows having any (or all) of the themes, each of them once"""
+        theme_ids = set(theme_ids)
+        memberships = AstronomyShow.show_themes.through.objects.filter(
+            showtheme_id__in=theme_ids
+        )
+        if match_all:
+            return self.filter(
+                pk__in=memberships.values("astronomyshow_id")
+                .annotate(themes=Count("showtheme_id"))
+                .filter(themes=len(theme_ids))
+                .values("astronomyshow_id")
+            )
+        return self.filter(
+            Exists(memberships.filter(astronomyshow_id=OuterRef("pk")))
+        )
+
+
 class AstronomyShow(models.Model):
     title = models.CharField(max_length=150)
     description = models.CharField(max_length=255)
@@ -31,6 +56,12 @@ class AstronomyShow(models.Model):
         blank=True
     )
     image = models.ImageField(null=True, upload_to=image_path_file)
+    # storage names of the resized copies of `image`, see images.py
+    image_variants = models.JSONField(default=dict, blank=True)
+    # minutes the dome is taken by a session of the show
+    duration = models.PositiveIntegerField(default=60)
+
+    objects = AstronomyShowQuerySet.as_manager()
 
     def __str__(self):
         return self.title
@@ -61,6 +92,32 @@ class Reservation(models.Model):
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["user", "created_at", "id"]),
+        ]
+
+
+class ShowSessionQuerySet(models.QuerySet):
+    def with_tickets_available(self):
+        return self.annotate(
+            tickets_available=F("planetarium_dome__rows")
+            * F("planetarium_dome__seats_in_row")
+            - F("tickets_sold")
+        )
+
+    def _filter_by_seats_left(self, lookup, seats_left):
+        return self.alias(
+            capacity=F("planetarium_dome__rows")
+            * F("planetarium_dome__seats_in_row")
+        ).filter(**{f"tickets_sold__{lookup}": F("capacity") - seats_left})
+
+    def min_available(self, tickets):
+        return self._filter_by_seats_left("lte", tickets)
+
+    def sold_out(self, sold_out=True):
+        if sold_out:
+            return self._filter_by_seats_left("gte", 0)
+        return self.min_available(1)
 
 
 class ShowSession(models.Model):
@@ -75,10 +132,44 @@ class ShowSession(models.Model):
         related_name="show_sessions"
     )
     show_time = models.DateTimeField()
+    tickets_sold = models.PositiveIntegerField(default=0, editable=False)
+    # bookings for the session are serialized through a per-session lock
+    high_contention = models.BooleanField(default=False)
+
+    objects = ShowSessionQuerySet.as_manager()
+
+    @staticmethod
+    def add_tickets_sold(counts):
+        """Applies {show_session_id: delta} to the sold-seat counters"""
+        for show_session_id, delta in sorted(counts.items()):
+            if delta:
+                ShowSession.objects.filter(pk=show_session_id).update(
+                    tickets_sold=F("tickets_sold") + delta
+                )
+
+    @property
+    def is_sold_out(self):
+        return self.tickets_sold >= self.planetarium_dome.capacity
+
+    def taken_seats(self):
+        """Returns sold and held (row, seat) pairs with a single query"""
+        sold = self.tickets.order_by().values_list("row", "seat")
+        held = HeldSeat.objects.active().filter(
+            show_session=self
+        ).order_by().values_list("row", "seat")
+        return list(sold.union(held).order_by("row", "seat"))
 
     def __str__(self):
         return f"Date: {self.show_time} - Show: {self.astronomy_show.title}"
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["planetarium_dome", "tickets_sold"]),
+            models.Index(fields=["show_time", "id"]),
+            models.Index(fields=["planetarium_dome", "show_time"]),
+            models.Index(fields=["astronomy_show", "show_time"]),
+        ]
+
 
 class Ticket(models.Model):
     row = models.IntegerField()
@@ -111,6 +202,31 @@ class Ticket(models.Model):
                     }
                 )
 
+    @staticmethod
+    def taken_places(places):
+        """
+        Returns the (show_session_id, row, seat) places that are already
+        sold or held, with a single query
+        """
+        places = set(places)
+        if not places:
+            return set()
+
+        show_session_ids, rows, seats = (set(values) for values in zip(*places))
+        lookups = {
+            "show_session_id__in": show_session_ids,
+            "row__in": rows,
+            "seat__in": seats,
+        }
+        sold = Ticket.objects.filter(**lookups).order_by().values_list(
+            "show_session_id", "row", "seat"
+        )
+        held = HeldSeat.objects.active().filter(**lookups).order_by().values_list(
+            "show_session_id", "row", "seat"
+        )
+
+        return places.intersection(sold.union(held))
+
     def clean(self):
         Ticket.validate_ticket(
             self.row,
@@ -139,3 +255,200 @@ class Ticket(models.Model):
     class Meta:
         unique_together = ("show_session", "row", "seat")
         ordering = ["row", "seat"]
+
+
+class SeatHold(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    show_session = models.ForeignKey(
+        ShowSession,
+        on_delete=models.CASCADE,
+        related_name="seat_holds"
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    @property
+    def is_expired(self):
+        return self.expires_at <= timezone.now()
+
+    @staticmethod
+    def sweep_expired(batch_size=1000):
+        """Deletes expired holds batch by batch, returns how many were removed"""
+        swept = 0
+        while True:
+            batch = list(
+                SeatHold.objects.filter(expires_at__lte=timezone.now())
+                .values_list("pk", flat=True)[:batch_size]
+            )
+            if not batch:
+                return swept
+            released = list(
+                HeldSeat.objects.filter(hold_id__in=batch).values_list(
+                    "show_session_id", "row", "seat"
+                )
+            )
+            HeldSeat.objects.filter(hold_id__in=batch).delete()
+            SeatHold.objects.filter(pk__in=batch).delete()
+            send_seats_changed(SeatHold, released=released)
+            swept += len(batch)
+
+    def convert(self, reservation):
+        """
+        Turns the held seats into tickets of `reservation` with a single
+        INSERT ... SELECT, returns the number of tickets created
+        """
+        quote_name = connection.ops.quote_name
+        columns = ("row", "seat", "show_session_id", "reservation_id")
+        select_sql, params = (
+            HeldSeat.objects.filter(hold=self)
+            .order_by()
+            .values_list("row", "seat", "show_session_id", Value(reservation.id))
+            .query.sql_with_params()
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {quote_name(Ticket._meta.db_table)} "
+                f"({', '.join(quote_name(column) for column in columns)}) "
+                f"{select_sql}",
+                params,
+            )
+            created = cursor.rowcount
+
+        ShowSession.add_tickets_sold({self.show_session_id: created})
+        send_seats_changed(SeatHold, taken=self.places())
+        self.delete()
+        return created
+
+    def places(self):
+        return [
+            (self.show_session_id, held_seat.row, held_seat.seat)
+            for held_seat in self.seats.all()
+        ]
+
+    def release(self):
+        send_seats_changed(SeatHold, released=self.places())
+        self.delete()
+
+    def __str__(self):
+        return f"{str(self.show_session)} (held until {self.expires_at})"
+
+    class Meta:
+        ordering = ["-created_at"]
+
+
+class HeldSeatQuerySet(models.QuerySet):
+    def active(self):
+        return self.filter(hold__expires_at__gt=timezone.now())
+
+
+class HeldSeat(models.Model):
+    hold = models.ForeignKey(
+        SeatHold,
+        on_delete=models.CASCADE,
+        related_name="seats"
+    )
+    show_session = models.ForeignKey(
+        ShowSession,
+        on_delete=models.CASCADE,
+        related_name="held_seats"
+    )
+    row = models.IntegerField()
+    seat = models.IntegerField()
+
+    objects = HeldSeatQuerySet.as_manager()
+
+    def __str__(self):
+        return f"{str(self.hold)} (row: {self.row}, seat: {self.seat})"
+
+    class Meta:
+        unique_together = ("show_session", "row", "seat")
+        ordering = ["row", "seat"]
+
+
+class IdempotencyKey(models.Model):
+    # sha256 of the user and the Idempotency-Key header, so a retry costs
+    # a single primary key lookup
+    key = models.CharField(max_length=64, primary_key=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE
+    )
+    request_hash = models.CharField(max_length=64)
+    response_status = models.PositiveSmallIntegerField(null=True)
+    response_data = models.JSONField(null=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    @staticmethod
+    def make_key(user, header):
+        return hashlib.sha256(f"{user.pk}:{header}".encode()).hexdigest()
+
+    @property
+    def is_expired(self):
+        return self.expires_at <= timezone.now()
+
+    def __str__(self):
+        return f"{self.key} ({self.response_status})"
+
+
+class ReservationRequest(models.Model):
+    class Status(models.TextChoices):
+        PENDING = "pending"
+        CONFIRMED = "confirmed"
+        REJECTED = "rejected"
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE
+    )
+    payload = models.JSONField(encoder=DjangoJSONEncoder)
+    status = models.CharField(
+        max_length=10,
+        choices=Status.choices,
+        default=Status.PENDING
+    )
+    errors = models.JSONField(null=True, encoder=DjangoJSONEncoder)
+    reservation = models.OneToOneField(
+        Reservation,
+        null=True,
+        on_delete=models.SET_NULL,
+        related_name="request"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True)
+
+    def __str__(self):
+        return f"{self.id} ({self.status})"
+
+    class Meta:
+        ordering = ["created_at"]
+        indexes = [
+            models.Index(fields=["status", "created_at"]),
+        ]
+
+
+class DomeSchedule(models.Model):
+    """
+    Sessions of a dome on one local day, kept up to date by
+    planetarium.schedules so calendars are served with a single read
+    """
+    planetarium_dome = models.ForeignKey(
+        to=PlanetariumDome,
+        on_delete=models.CASCADE,
+        related_name="schedules"
+    )
+    date = models.DateField()
+    sessions = models.JSONField(default=list, encoder=DjangoJSONEncoder)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.planetarium_dome.name}: {self.date}"
+
+    class Meta:
+        ordering = ["date"]
+        unique_together = ("planetarium_dome", "date")
@@ -0,0 +1,49 @@
+import base64
+
+
+def seat_index(row, seat, seats_in_row):
+    """Returns the position of a seat when counting row by row from zero"""
+    return (row - 1) * seats_in_row + seat - 1
+
+
+def occupancy_bitmap(rows, seats_in_row, places):
+    """Packs taken (row, seat) places into a bitset, most significant bit first"""
+    bitmap = bytearray((rows * seats_in_row + 7) // 8)
+    for row, seat in places:
+        index = seat_index(row, seat, seats_in_row)
+        bitmap[index // 8] |= 0x80 >> (index % 8)
+    return bitmap
+
+
+def encode_base64(rows, seats_in_row, places):
+    bitmap = occupancy_bitmap(rows, seats_in_row, places)
+    return base64.b64encode(bytes(bitmap)).decode("ascii")
+
+
+def encode_rle(rows, seats_in_row, places):
+    """Returns run lengths of alternating free and taken seats, free first"""
+    runs = [0]
+    position = 0
+
+    def extend(length, taken):
+        if (len(runs) % 2 == 0) != taken:
+            runs.append(0)
+        runs[-1] += length
+
+    for index in sorted(
+        {seat_index(row, seat, seats_in_row) for row, seat in places}
+    ):
+        if index > position:
+            extend(index - position, taken=False)
+        extend(1, taken=True)
+        position = index + 1
+
+    if position < rows * seats_in_row:
+        extend(rows * seats_in_row - position, taken=False)
+    return runs
+
+
+ENCODERS = {
+    "base64": encode_base64,
+    "rle": encode_rle,
+}
@@ -0,0 +1,217 @@
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import serializers
+from rest_framework.relations import RelatedField
+
+
+def select_related_lookups(select_related, prefix=""):
+    """Flattens the nested dict of query.select_related into lookups"""
+    lookups = []
+    for name, nested in select_related.items():
+        lookups.append(f"{prefix}{name}")
+        lookups.extend(select_related_lookups(nested, f"{prefix}{name}__"))
+    return lookups
+
+
+def lookup_root(lookup):
+    if isinstance(lookup, Prefetch):
+        lookup = lookup.prefetch_through
+    return lookup.split("__")[0]
+
+
+class QueryPlan:
+    """
+    The columns, joins and prefetches that serializing instances of
+    `model` reads, found by following the sources of the serializer
+    fields through the model. `columns` is None when some field reads
+    something its source does not tell, such as a method or a property.
+    """
+
+    def __init__(self, model, annotations=()):
+        self.model = model
+        self.annotations = set(annotations)
+        self.columns = set()
+        self.select_related = set()
+        self.prefetches = {}
+
+    @classmethod
+    def for_serializer(cls, serializer, queryset, fields=None):
+        plan = cls(queryset.model, queryset.query.annotations)
+        plan.add_serializer(serializer, queryset.model, fields=fields)
+        return plan
+
+    def add_column(self, lookup):
+        if self.columns is not None:
+            self.columns.add(lookup)
+
+    def read_all(self, model, prefix):
+        if not prefix:
+            self.columns = None
+            return
+        for field in model._meta.concrete_fields:
+            self.add_column(f"{prefix}{field.name}")
+
+    def add_serializer(self, serializer, model, prefix="", fields=None):
+        for name, field in serializer.fields.items():
+            if field.write_only or (fields is not None and name not in fields):
+                continue
+            if field.source == "*":
+                if isinstance(field, serializers.BaseSerializer):
+                    self.add_serializer(field, model, prefix)
+                else:
+                    self.read_all(model, prefix)
+                continue
+            self.add_source(field, model, prefix)
+
+    def add_source(self, field, model, prefix):
+        attrs = field.source_attrs
+        for position, attr in enumerate(attrs):
+            lookup = f"{prefix}{attr}"
+            last = position == len(attrs) - 1
+            if not prefix and attr in self.annotations:
+                return
+            try:
+                model_field = model._meta.get_field(attr)
+            except FieldDoesNotExist:
+                self.read_all(model, prefix)
+                return
+
+            if model_field.many_to_many or model_field.one_to_many:
+                self.add_prefetch(lookup, model_field, field if last else None)
+                return
+            if not model_field.is_relation:
+                self.add_column(lookup)
+                return
+
+            if model_field.concrete:
+                self.add_column(lookup)
+            if (
+                last
+                and isinstance(field, RelatedField)
+                and field.use_pk_only_optimization()
+            ):
+                # the foreign key column alone gives the related pk
+                return
+            self.select_related.add(lookup)
+            model = model_field.related_model
+            prefix = f"{lookup}__"
+
+        if isinstance(field, serializers.BaseSerializer):
+            self.add_serializer(field, model, prefix)
+        else:
+            self.read_all(model, prefix)
+
+    def add_prefetch(self, lookup, model_field, field):
+        plan = QueryPlan(model_field.related_model)
+        if isinstance(field, serializers.ListSerializer):
+            plan.add_serializer(field.child, plan.model)
+        else:
+            plan.columns = None
+        if model_field.one_to_many:
+            # prefetched rows are matched to their parent on this column
+            plan.add_column(model_field.field.name)
+
+        if lookup in self.prefetches:
+            plan.merge(self.prefetches[lookup])
+        self.prefetches[lookup] = plan
+
+    def merge(self, other):
+        if self.columns is None or other.columns is None:
+            self.columns = None
+        else:
+            self.columns |= other.columns
+        self.select_related |= other.select_related
+        for lookup, plan in other.prefetches.items():
+            if lookup in self.prefetches:
+                plan.merge(self.prefetches[lookup])
+            self.prefetches[lookup] = plan
+
+    def trim(self, queryset):
+        """
+        Drops the joins and prefetches of `queryset` under relations no
+        planned field goes through, such as those of the fields a sparse
+        fieldset leaves out
+        """
+        if self.columns is None:
+            return queryset
+        roots = {
+            lookup_root(lookup)
+            for lookup in (*self.select_related, *self.prefetches)
+        }
+
+        select_related = queryset.query.select_related
+        if isinstance(select_related, dict):
+            joins = [
+                lookup
+                for lookup in select_related_lookups(select_related)
+                if lookup_root(lookup) in roots
+            ]
+            queryset = queryset.select_related(None)
+            if joins:
+                queryset = queryset.select_related(*joins)
+        return queryset.prefetch_related(None).prefetch_related(*[
+            lookup
+            for lookup in queryset._prefetch_related_lookups
+            if lookup_root(lookup) in roots
+        ])
+
+    def apply(self, queryset):
+        """
+        Adds the planned joins, prefetches and columns to `queryset`.
+        Relations the queryset prefetches already are left as they are.
+        """
+        if self.select_related:
+            queryset = queryset.select_related(*sorted(self.select_related))
+
+        prefetched = [
+            lookup.prefetch_to if isinstance(lookup, Prefetch) else lookup
+            for lookup in queryset._prefetch_related_lookups
+        ]
+        for lookup, plan in sorted(self.prefetches.items()):
+            if any(
+                lookup == other
+                or other.startswith(f"{lookup}__")
+                or lookup.startswith(f"{other}__")
+                for other in prefetched
+            ):
+                continue
+            queryset = queryset.prefetch_related(
+                Prefetch(
+                    lookup, queryset=plan.apply(plan.model._default_manager.all())
+                )
+            )
+
+        select_related = queryset.query.select_related
+        if self.columns is None or select_related is True:
+            return queryset
+        if isinstance(select_related, dict) and any(
+            lookup not in self.select_related
+            for lookup in select_related_lookups(select_related)
+        ):
+            # joins made by the view read columns the plan does not know
+            return queryset
+        return queryset.only(*self.columns)
+
+
+class QueryPlanMixin:
+    """
+    Joins, prefetches and loads only what the serializer of list and
+    retrieve reads, so nested fields never cost a query per object. With
+    sparse fields the plan covers those fields alone, and joins and
+    prefetches of the view that only the others need are dropped.
+    """
+
+    planned_actions = ("list", "retrieve")
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.action in self.planned_actions:
+            serializer = self.get_serializer_class()(
+                context=self.get_serializer_context()
+            )
+            fields = getattr(self, "sparse_fields", None)
+            plan = QueryPlan.for_serializer(serializer, queryset, fields)
+            if fields is not None:
+                queryset = plan.trim(queryset)
+            queryset = plan.apply(queryset)
+        return queryset
@@ -0,0 +1,265 @@
+from django.db.models.signals import (
+    pre_save,
+    post_save,
+    post_delete,
+    pre_delete,
+    m2m_changed
+)
+from django.db import transaction
+from django.dispatch import receiver
+
+from planetarium.autocomplete import autocomplete_index
+from planetarium.broadcast import get_broker, show_session_channel
+from planetarium.events import seats_changed_message
+from planetarium.facets import THEME_MEMBERSHIP
+from planetarium.images import generate_variants_on_commit
+from planetarium.models import (
+    AstronomyShow,
+    PlanetariumDome,
+    SeatHold,
+    ShowSession,
+    ShowTheme,
+    Ticket
+)
+from planetarium.schedules import (
+    refresh_schedules,
+    refresh_schedules_on_commit,
+    show_session_days
+)
+from planetarium.search import index_astronomy_shows, remove_astronomy_shows
+from planetarium.seating import FreeSeatIndex, forget_hold_expiry
+from planetarium.signals import seats_changed, send_seats_changed
+from planetarium.versions import (
+    bump,
+    bump_objects,
+    bump_on_commit,
+    collection_version,
+    object_version
+)
+
+
+def ticket_place(ticket):
+    return ticket.show_session_id, ticket.row, ticket.seat
+
+
+@receiver(post_save, sender=Ticket)
+def count_sold_ticket(sender, instance, created, **kwargs):
+    if created:
+        ShowSession.add_tickets_sold({instance.show_session_id: 1})
+        send_seats_changed(Ticket, taken=[ticket_place(instance)])
+
+
+@receiver(post_delete, sender=Ticket)
+def count_released_ticket(sender, instance, **kwargs):
+    ShowSession.add_tickets_sold({instance.show_session_id: -1})
+    send_seats_changed(Ticket, released=[ticket_place(instance)])
+
+
+@receiver(seats_changed)
+def invalidate_free_seat_index(sender, show_session_id, **kwargs):
+    FreeSeatIndex.invalidate(show_session_id)
+
+
+@receiver(seats_changed, sender=SeatHold)
+def invalidate_hold_expiry(sender, show_session_id, **kwargs):
+    forget_hold_expiry(show_session_id)
+
+
+@receiver(seats_changed)
+def bump_show_session_on_seats_changed(sender, show_session_id, **kwargs):
+    bump(
+        collection_version(ShowSession),
+        object_version(ShowSession, show_session_id)
+    )
+
+
+@receiver(seats_changed)
+def refresh_show_session_schedule(sender, show_session_id, **kwargs):
+    # seats_changed is sent after commit already
+    refresh_schedules(
+        show_session_days(ShowSession.objects.filter(pk=show_session_id))
+    )
+
+
+@receiver(seats_changed)
+def publish_seats_changed(sender, show_session_id, taken, released, **kwargs):
+    get_broker().publish(
+        show_session_channel(show_session_id),
+        seats_changed_message(show_session_id, taken, released)
+    )
+
+
+def bump_changed_object(sender, instance, **kwargs):
+    bump_objects(sender, [instance.pk])
+
+
+for model in (ShowTheme, PlanetariumDome, AstronomyShow, ShowSession):
+    post_save.connect(bump_changed_object, sender=model)
+    post_delete.connect(bump_changed_object, sender=model)
+
+
+@receiver(post_save, sender=PlanetariumDome)
+def bump_dome_show_sessions(sender, instance, **kwargs):
+    bump_objects(
+        ShowSession, instance.show_sessions.values_list("id", flat=True)
+    )
+
+
+@receiver(post_save, sender=AstronomyShow)
+def bump_astronomy_show_sessions(sender, instance, **kwargs):
+    bump_objects(
+        ShowSession, instance.show_sessions.values_list("id", flat=True)
+    )
+
+
+def bump_astronomy_shows(astronomy_shows):
+    bump_objects(AstronomyShow, astronomy_shows.values_list("id", flat=True))
+    bump_objects(
+        ShowSession,
+        ShowSession.objects.filter(
+            astronomy_show__in=astronomy_shows
+        ).values_list("id", flat=True)
+    )
+
+
+@receiver(m2m_changed, sender=AstronomyShow.show_themes.through)
+def bump_astronomy_shows_on_themes_changed(
+    sender, instance, action, reverse, pk_set, **kwargs
+):
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+    if not reverse:
+        astronomy_shows = AstronomyShow.objects.filter(pk=instance.pk)
+    elif action == "pre_clear":
+        astronomy_shows = AstronomyShow.objects.filter(show_themes=instance)
+    else:
+        astronomy_shows = AstronomyShow.objects.filter(pk__in=pk_set)
+    bump_astronomy_shows(astronomy_shows)
+
+
+@receiver([post_save, pre_delete], sender=ShowTheme)
+def bump_theme_astronomy_shows(sender, instance, **kwargs):
+    bump_astronomy_shows(AstronomyShow.objects.filter(show_themes=instance))
+
+
+@receiver(m2m_changed, sender=AstronomyShow.show_themes.through)
+def bump_theme_membership_on_themes_changed(sender, action, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        bump_on_commit(THEME_MEMBERSHIP)
+
+
+@receiver(post_save, sender=ShowTheme)
+@receiver(post_delete, sender=ShowTheme)
+@receiver(post_delete, sender=AstronomyShow)
+def bump_theme_membership(sender, **kwargs):
+    # deletes drop memberships without sending m2m_changed
+    bump_on_commit(THEME_MEMBERSHIP)
+
+
+@receiver(pre_save, sender=ShowSession)
+def remember_show_session_day(sender, instance, **kwargs):
+    # a moved session also has to leave the schedule it was on
+    instance._schedule_days = (
+        show_session_days(ShowSession.objects.filter(pk=instance.pk))
+        if instance.pk
+        else set()
+    )
+
+
+@receiver(post_save, sender=ShowSession)
+def refresh_saved_show_session_schedule(sender, instance, **kwargs):
+    refresh_schedules_on_commit(
+        getattr(instance, "_schedule_days", set())
+        | show_session_days(ShowSession.objects.filter(pk=instance.pk))
+    )
+
+
+@receiver(pre_delete, sender=ShowSession)
+def refresh_deleted_show_session_schedule(sender, instance, **kwargs):
+    refresh_schedules_on_commit(
+        show_session_days(ShowSession.objects.filter(pk=instance.pk))
+    )
+
+
+@receiver(post_save, sender=PlanetariumDome)
+def refresh_dome_schedules(sender, instance, **kwargs):
+    refresh_schedules_on_commit(show_session_days(instance.show_sessions.all()))
+
+
+@receiver(post_save, sender=AstronomyShow)
+def refresh_astronomy_show_schedules(sender, instance, **kwargs):
+    refresh_schedules_on_commit(show_session_days(instance.show_sessions.all()))
+
+
+@receiver(post_save, sender=AstronomyShow)
+def index_saved_astronomy_show(sender, instance, **kwargs):
+    index_astronomy_shows([instance.pk])
+
+
+@receiver(post_delete, sender=AstronomyShow)
+def remove_deleted_astronomy_show(sender, instance, **kwargs):
+    remove_astronomy_shows([instance.pk])
+
+
+@receiver(m2m_changed, sender=AstronomyShow.show_themes.through)
+def index_astronomy_shows_on_themes_changed(
+    sender, instance, action, reverse, pk_set, **kwargs
+):
+    if not reverse:
+        if action in ("post_add", "post_remove", "post_clear"):
+            index_astronomy_shows([instance.pk])
+    elif action in ("post_add", "post_remove"):
+        index_astronomy_shows(pk_set)
+    elif action == "pre_clear":
+        instance._indexed_astronomy_shows = list(
+            instance.astronomy_shows.values_list("id", flat=True)
+        )
+    elif action == "post_clear":
+        index_astronomy_shows(instance._indexed_astronomy_shows)
+
+
+@receiver(post_save, sender=ShowTheme)
+def index_theme_astronomy_shows(sender, instance, **kwargs):
+    index_astronomy_shows(instance.astronomy_shows.values_list("id", flat=True))
+
+
+@receiver(pre_delete, sender=ShowTheme)
+def remember_theme_astronomy_shows(sender, instance, **kwargs):
+    instance._indexed_astronomy_shows = list(
+        instance.astronomy_shows.values_list("id", flat=True)
+    )
+
+
+@receiver(post_delete, sender=ShowTheme)
+def index_deleted_theme_astronomy_shows(sender, instance, **kwargs):
+    index_astronomy_shows(getattr(instance, "_indexed_astronomy_shows", []))
+
+
+def update_autocomplete_on_commit(kind, pk, label=None):
+    transaction.on_commit(lambda: autocomplete_index.update(kind, pk, label))
+
+
+@receiver(post_save, sender=AstronomyShow)
+def autocomplete_saved_astronomy_show(sender, instance, **kwargs):
+    update_autocomplete_on_commit("astronomy_show", instance.pk, instance.title)
+
+
+@receiver(post_delete, sender=AstronomyShow)
+def autocomplete_deleted_astronomy_show(sender, instance, **kwargs):
+    update_autocomplete_on_commit("astronomy_show", instance.pk)
+
+
+@receiver(post_save, sender=ShowTheme)
+def autocomplete_saved_show_theme(sender, instance, **kwargs):
+    update_autocomplete_on_commit("show_theme", instance.pk, instance.name)
+
+
+@receiver(post_delete, sender=ShowTheme)
+def autocomplete_deleted_show_theme(sender, instance, **kwargs):
+    update_autocomplete_on_commit("show_theme", instance.pk)
+
+
+@receiver(post_save, sender=AstronomyShow)
+def generate_image_variants(sender, instance, **kwargs):
+    if instance.image_variants.get("source") != (instance.image.name or None):
+        generate_variants_on_commit(instance.pk)
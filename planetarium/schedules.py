@@ -0,0 +1,86 @@
+from datetime import datetime, time, timedelta
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from planetarium.models import DomeSchedule, ShowSession
+
+
+def day_start(date):
+    """Start of the day in the current time zone, as an aware datetime"""
+    return timezone.make_aware(datetime.combine(date, time.min))
+
+
+def show_session_days(show_sessions):
+    """Returns the (planetarium_dome_id, local date) days of show sessions"""
+    return {
+        (planetarium_dome_id, timezone.localdate(show_time))
+        for planetarium_dome_id, show_time in show_sessions.values_list(
+            "planetarium_dome_id", "show_time"
+        )
+    }
+
+
+def schedule_sessions(planetarium_dome_id, date):
+    show_sessions = (
+        ShowSession.objects.with_tickets_available()
+        .filter(
+            planetarium_dome_id=planetarium_dome_id,
+            show_time__gte=day_start(date),
+            show_time__lt=day_start(date + timedelta(days=1)),
+        )
+        .order_by("show_time", "id")
+        .values_list(
+            "id",
+            "show_time",
+            "astronomy_show_id",
+            "astronomy_show__title",
+            "tickets_available",
+        )
+    )
+    return [
+        {
+            "id": show_session_id,
+            "show_time": show_time,
+            "astronomy_show": astronomy_show_id,
+            "astronomy_show_title": title,
+            "tickets_available": tickets_available,
+        }
+        for (
+            show_session_id, show_time, astronomy_show_id, title, tickets_available
+        ) in show_sessions
+    ]
+
+
+def refresh_schedule(planetarium_dome_id, date):
+    """Rebuilds the document of one dome and day, dropping it once empty"""
+    schedules = DomeSchedule.objects.filter(
+        planetarium_dome_id=planetarium_dome_id, date=date
+    )
+    sessions = schedule_sessions(planetarium_dome_id, date)
+    if not sessions:
+        schedules.delete()
+        return
+    if schedules.update(sessions=sessions, updated_at=timezone.now()):
+        return
+    try:
+        with transaction.atomic():
+            DomeSchedule.objects.create(
+                planetarium_dome_id=planetarium_dome_id,
+                date=date,
+                sessions=sessions,
+            )
+    except IntegrityError:
+        # created concurrently by another refresh
+        schedules.update(sessions=sessions, updated_at=timezone.now())
+
+
+def refresh_schedules(days):
+    for planetarium_dome_id, date in sorted(days):
+        refresh_schedule(planetarium_dome_id, date)
+
+
+def refresh_schedules_on_commit(days):
+    days = set(days)
+    if days:
+        transaction.on_commit(lambda: refresh_schedules(days))
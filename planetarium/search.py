@@ -0,0 +1,168 @@
+import re
+
+from django.db import connection
+from django.db.models import BooleanField, FloatField, Q
+from django.db.models.expressions import RawSQL
+
+from planetarium.models import AstronomyShow
+
+# maintained by migration 0013, a tsvector column with a GIN index on
+# Postgres and an FTS5 table keyed by the show id on SQLite
+SEARCH_VECTOR = "search_vector"
+FTS_TABLE = "planetarium_astronomyshow_fts"
+
+POSTGRES_DOCUMENT = """
+    setweight(to_tsvector('english', astronomy_show.title), 'A')
+    || setweight(to_tsvector('english', astronomy_show.description), 'B')
+    || setweight(to_tsvector('english', coalesce((
+        SELECT string_agg(theme.name, ' ')
+        FROM planetarium_showtheme theme
+        JOIN planetarium_astronomyshow_show_themes show_theme
+            ON show_theme.showtheme_id = theme.id
+        WHERE show_theme.astronomyshow_id = astronomy_show.id
+    ), '')), 'C')
+"""
+
+SQLITE_THEMES = """
+    coalesce((
+        SELECT group_concat(theme.name, ' ')
+        FROM planetarium_showtheme theme
+        JOIN planetarium_astronomyshow_show_themes show_theme
+            ON show_theme.showtheme_id = theme.id
+        WHERE show_theme.astronomyshow_id = astronomy_show.id
+    ), '')
+"""
+
+
+def search_terms(query):
+    return re.findall(r"\w+", query)
+
+
+class PostgresSearchBackend:
+    def index(self, show_ids):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE planetarium_astronomyshow astronomy_show "
+                f"SET {SEARCH_VECTOR} = {POSTGRES_DOCUMENT} "
+                f"WHERE astronomy_show.id = ANY(%s)",
+                [list(show_ids)]
+            )
+
+    def remove(self, show_ids):
+        # the vector is deleted with its row
+        pass
+
+    def search(self, queryset, query):
+        table = queryset.model._meta.db_table
+        tsquery = "websearch_to_tsquery('english', %s)"
+        return queryset.filter(
+            RawSQL(
+                f"{table}.{SEARCH_VECTOR} @@ {tsquery}",
+                [query],
+                output_field=BooleanField()
+            )
+        ).annotate(
+            rank=RawSQL(
+                f"ts_rank({table}.{SEARCH_VECTOR}, {tsquery})",
+                [query],
+                output_field=FloatField()
+            )
+        )
+
+
+class SqliteSearchBackend:
+    def index(self, show_ids):
+        show_ids = list(show_ids)
+        placeholders = ", ".join(["%s"] * len(show_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})",
+                show_ids
+            )
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, title, description, themes) "
+                f"SELECT astronomy_show.id, astronomy_show.title, "
+                f"astronomy_show.description, {SQLITE_THEMES} "
+                f"FROM planetarium_astronomyshow astronomy_show "
+                f"WHERE astronomy_show.id IN ({placeholders})",
+                show_ids
+            )
+
+    def remove(self, show_ids):
+        show_ids = list(show_ids)
+        placeholders = ", ".join(["%s"] * len(show_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})",
+                show_ids
+            )
+
+    def search(self, queryset, query):
+        table = queryset.model._meta.db_table
+        # every word must match, quoted so user input is never FTS syntax
+        match = " ".join(f'"{term}"' for term in search_terms(query))
+        return queryset.filter(
+            pk__in=RawSQL(
+                f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s",
+                [match]
+            )
+        ).annotate(
+            # bm25 is lower for better matches, title weighs the most
+            rank=RawSQL(
+                f"(SELECT -bm25({FTS_TABLE}, 10.0, 4.0, 2.0) FROM {FTS_TABLE} "
+                f"WHERE {FTS_TABLE} MATCH %s AND rowid = {table}.id)",
+                [match],
+                output_field=FloatField()
+            )
+        )
+
+
+class FallbackSearchBackend:
+    """Unindexed substring search for other databases"""
+
+    def index(self, show_ids):
+        pass
+
+    def remove(self, show_ids):
+        pass
+
+    def search(self, queryset, query):
+        condition = Q()
+        for term in search_terms(query):
+            condition &= (
+                Q(title__icontains=term)
+                | Q(description__icontains=term)
+                | Q(show_themes__name__icontains=term)
+            )
+        return queryset.filter(
+            pk__in=AstronomyShow.objects.filter(condition).values("pk")
+        ).annotate(rank=RawSQL("0", [], output_field=FloatField()))
+
+
+BACKENDS = {
+    "postgresql": PostgresSearchBackend,
+    "sqlite": SqliteSearchBackend,
+}
+
+
+def get_search_backend():
+    return BACKENDS.get(connection.vendor, FallbackSearchBackend)()
+
+
+def index_astronomy_shows(show_ids):
+    show_ids = list(show_ids)
+    if show_ids:
+        get_search_backend().index(show_ids)
+
+
+def remove_astronomy_shows(show_ids):
+    show_ids = list(show_ids)
+    if show_ids:
+        get_search_backend().remove(show_ids)
+
+
+def search_astronomy_shows(queryset, query):
+    """Shows matching every word of `query`, best ranked first"""
+    if not search_terms(query):
+        return queryset.none()
+    return get_search_backend().search(queryset, query).order_by("-rank", "id")
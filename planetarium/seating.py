@@ -0,0 +1,128 @@
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from planetarium.models import SeatHold, ShowSession
+from planetarium.versions import bump, object_version
+
+
+def free_seat_index_key(show_session_id):
+    return f"planetarium:free-seats:{show_session_id}"
+
+
+def hold_expiry_key(show_session_id):
+    return f"planetarium:hold-expiry:{show_session_id}"
+
+
+def next_hold_expiry(show_session_id):
+    """
+    The earliest expiry of the active holds of a show session, None when
+    it has none, cached until its holds change
+    """
+    key = hold_expiry_key(show_session_id)
+    cached = cache.get(key)
+    if cached is None:
+        cached = (
+            SeatHold.objects.filter(
+                show_session_id=show_session_id, expires_at__gt=timezone.now()
+            )
+            .order_by("expires_at")
+            .values_list("expires_at", flat=True)
+            .first(),
+        )
+        cache.set(key, cached)
+    return cached[0]
+
+
+def forget_hold_expiry(show_session_id):
+    cache.delete(hold_expiry_key(show_session_id))
+
+
+def expire_holds(show_session_id):
+    """
+    Bumps the version of a show session once its earliest hold expired,
+    the held seats are free from then on, before any sweep deletes them
+    """
+    expiry = next_hold_expiry(show_session_id)
+    if expiry is not None and expiry <= timezone.now():
+        forget_hold_expiry(show_session_id)
+        bump(object_version(ShowSession, show_session_id))
+
+
+class FreeSeatIndex:
+    """Free seats of a show session kept as (first, last) intervals per row"""
+
+    def __init__(self, rows, seats_in_row, taken, valid_until=None):
+        self.rows = rows
+        self.seats_in_row = seats_in_row
+        # the earliest hold expiry, after which more seats become free
+        self.valid_until = valid_until
+
+        taken_in_row = defaultdict(list)
+        for row, seat in taken:
+            taken_in_row[row].append(seat)
+
+        self.intervals = {}
+        for row in range(1, rows + 1):
+            intervals = []
+            first = 1
+            for seat in sorted(taken_in_row[row]):
+                if seat > first:
+                    intervals.append((first, seat - 1))
+                first = seat + 1
+            if first <= seats_in_row:
+                intervals.append((first, seats_in_row))
+            self.intervals[row] = intervals
+
+    @classmethod
+    def build(cls, show_session):
+        dome = show_session.planetarium_dome
+        next_expiry = (
+            show_session.seat_holds.filter(expires_at__gt=timezone.now())
+            .order_by("expires_at")
+            .values_list("expires_at", flat=True)
+            .first()
+        )
+        return cls(
+            dome.rows, dome.seats_in_row, show_session.taken_seats(), next_expiry
+        )
+
+    @classmethod
+    def get(cls, show_session):
+        """Returns the cached index, rebuilding it when it went stale"""
+        key = free_seat_index_key(show_session.id)
+        index = cache.get(key)
+        if index is None or index.is_stale():
+            index = cls.build(show_session)
+            cache.set(key, index)
+        return index
+
+    @staticmethod
+    def invalidate(show_session_id):
+        cache.delete(free_seat_index_key(show_session_id))
+
+    def is_stale(self):
+        return self.valid_until is not None and self.valid_until <= timezone.now()
+
+    def best_block(self, count):
+        """
+        Returns (row, seats) for `count` adjacent free seats, closest to the
+        centre row and then to the centre of that row, or None
+        """
+        centre_row = (self.rows + 1) / 2
+        centre_seat = (self.seats_in_row + 1) / 2
+        ideal_first = round(centre_seat - (count - 1) / 2)
+
+        for row in sorted(self.intervals, key=lambda r: (abs(r - centre_row), r)):
+            best = None
+            for first, last in self.intervals[row]:
+                if last - first + 1 < count:
+                    continue
+                start = min(max(ideal_first, first), last - count + 1)
+                distance = abs(start + (count - 1) / 2 - centre_seat)
+                if best is None or distance < best[0]:
+                    best = (distance, start)
+            if best is not None:
+                return row, list(range(best[1], best[1] + count))
+        return None
@@ -1,5 +1,12 @@
-from rest_framework import serializers
-from django.db import transaction
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction, IntegrityError
+from django.db.models import F, Manager, QuerySet
+from django.utils import timezone
+from rest_framework import serializers, status
+from rest_framework.exceptions import APIException
 
 from planetarium.models import (
     ShowTheme,
@@ -7,8 +14,18 @@ from planetarium.models import (
     ShowSession,
     Ticket,
     Reservation,
-    PlanetariumDome
+    PlanetariumDome,
+    SeatHold,
+    HeldSeat,
+    ReservationRequest,
+    DomeSchedule
 )
+from planetarium.locks import show_session_locks, ShowSessionSoldOut
+from planetarium.occupancy import ENCODERS
+from planetarium.schedules import refresh_schedules_on_commit
+from planetarium.signals import send_seats_changed
+from planetarium.timetable import IntervalIndex, expand_recurrence
+from planetarium.versions import bump_on_commit, collection_version
 
 
 class ShowThemeSerializer(serializers.ModelSerializer):
@@ -23,18 +40,60 @@ class PlanetariumDomeSerializer(serializers.ModelSerializer):
         fields = ("id", "name", "rows", "seats_in_row", "capacity")
 
 
+class DomeScheduleSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DomeSchedule
+        fields = ("date", "sessions")
+
+
 class AstronomyShowSerializer(serializers.ModelSerializer):
     class Meta:
         model = AstronomyShow
-        fields = ("id", "title", "description", "show_themes", "image")
+        fields = (
+            "id",
+            "title",
+            "description",
+            "duration",
+            "show_themes",
+            "image"
+        )
+
+
+class ImageVariantsField(serializers.Field):
+    """URLs of the resized copies of an image, by variant and format"""
+
+    def __init__(self, **kwargs):
+        kwargs["read_only"] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        storage = AstronomyShow._meta.get_field("image").storage
+        request = self.context.get("request")
+        urls = {}
+        for variant, files in value.get("files", {}).items():
+            urls[variant] = {}
+            for extension, name in files.items():
+                url = storage.url(name)
+                if request is not None:
+                    url = request.build_absolute_uri(url)
+                urls[variant][extension] = url
+        return urls
 
 
 class AstronomyShowListSerializer(AstronomyShowSerializer):
     show_themes = serializers.StringRelatedField(many=True, read_only=True)
+    image_variants = ImageVariantsField()
+
+    class Meta(AstronomyShowSerializer.Meta):
+        fields = AstronomyShowSerializer.Meta.fields + ("image_variants",)
 
 
 class AstronomyShowDetailSerializer(AstronomyShowSerializer):
     show_themes = ShowThemeSerializer(many=True, read_only=True)
+    image_variants = ImageVariantsField()
+
+    class Meta(AstronomyShowSerializer.Meta):
+        fields = AstronomyShowSerializer.Meta.fields + ("image_variants",)
 
 
 class AstronomyShowImageSerializer(serializers.ModelSerializer):
@@ -46,10 +105,209 @@ class AstronomyShowImageSerializer(serializers.ModelSerializer):
 class ShowSessionSerializer(serializers.ModelSerializer):
     class Meta:
         model = ShowSession
-        fields = ("id", "show_time", "astronomy_show", "planetarium_dome")
+        fields = (
+            "id",
+            "show_time",
+            "astronomy_show",
+            "planetarium_dome",
+            "high_contention"
+        )
+
+    def validate(self, attrs):
+        def value(field):
+            return attrs.get(field, getattr(self.instance, field, None))
 
+        show_time = value("show_time")
+        end = show_time + timedelta(minutes=value("astronomy_show").duration)
+        overlapping = IntervalIndex.for_dome(
+            value("planetarium_dome"),
+            show_time,
+            end,
+            exclude=self.instance and self.instance.pk
+        ).overlapping(show_time, end)
+        if overlapping is not None:
+            raise serializers.ValidationError(
+                {"show_time": f"Overlaps show session {overlapping} in the dome"}
+            )
+        return attrs
 
-class ShowSessionListSerializer(serializers.ModelSerializer):
+
+class ShowSessionScheduleSerializer(serializers.Serializer):
+    """Expands a weekly recurrence into show sessions of one show and dome"""
+
+    MAX_DAYS = 400
+
+    astronomy_show = serializers.PrimaryKeyRelatedField(
+        queryset=AstronomyShow.objects.all()
+    )
+    planetarium_dome = serializers.PrimaryKeyRelatedField(
+        queryset=PlanetariumDome.objects.all()
+    )
+    date_from = serializers.DateField()
+    date_to = serializers.DateField()
+    weekdays = serializers.ListField(
+        child=serializers.IntegerField(min_value=0, max_value=6),
+        allow_empty=False,
+        help_text="Days of the week, Monday is 0"
+    )
+    times = serializers.ListField(
+        child=serializers.TimeField(), allow_empty=False
+    )
+    high_contention = serializers.BooleanField(default=False)
+
+    def validate(self, attrs):
+        days = (attrs["date_to"] - attrs["date_from"]).days + 1
+        if not 1 <= days <= self.MAX_DAYS:
+            raise serializers.ValidationError(
+                {"date_to": f"The range must cover 1 to {self.MAX_DAYS} days"}
+            )
+        attrs["show_times"] = list(expand_recurrence(
+            attrs["date_from"], attrs["date_to"], attrs["weekdays"], attrs["times"]
+        ))
+        if not attrs["show_times"]:
+            raise serializers.ValidationError(
+                "The recurrence has no day in the date range"
+            )
+        return attrs
+
+    @staticmethod
+    def conflicts(planetarium_dome, show_times, duration):
+        """Show times overlapping each other or sessions already in the dome"""
+        index = IntervalIndex.for_dome(
+            planetarium_dome, show_times[0], show_times[-1] + duration
+        )
+        conflicts = []
+        previous_end = None
+        for show_time in show_times:
+            end = show_time + duration
+            if previous_end is not None and show_time < previous_end:
+                conflicts.append(
+                    {"show_time": show_time, "reason": "Overlaps the previous session"}
+                )
+            overlapping = index.overlapping(show_time, end)
+            if overlapping is not None:
+                conflicts.append({
+                    "show_time": show_time,
+                    "reason": f"Overlaps show session {overlapping}"
+                })
+            previous_end = end
+        return conflicts
+
+    def create(self, validated_data):
+        astronomy_show = validated_data["astronomy_show"]
+        planetarium_dome = validated_data["planetarium_dome"]
+        show_times = validated_data["show_times"]
+
+        with transaction.atomic():
+            # serializes scheduling in the dome, so the check below holds
+            PlanetariumDome.objects.select_for_update().filter(
+                pk=planetarium_dome.pk
+            ).first()
+            conflicts = self.conflicts(
+                planetarium_dome,
+                show_times,
+                timedelta(minutes=astronomy_show.duration)
+            )
+            if conflicts:
+                raise serializers.ValidationError({"conflicts": conflicts})
+
+            show_sessions = ShowSession.objects.bulk_create(
+                [
+                    ShowSession(
+                        astronomy_show=astronomy_show,
+                        planetarium_dome=planetarium_dome,
+                        show_time=show_time,
+                        high_contention=validated_data["high_contention"],
+                    )
+                    for show_time in show_times
+                ],
+                batch_size=1000
+            )
+            # bulk_create sends no post_save, so do what the receivers do
+            bump_on_commit(collection_version(ShowSession))
+            refresh_schedules_on_commit(
+                (planetarium_dome.id, timezone.localdate(show_time))
+                for show_time in show_times
+            )
+            return show_sessions
+
+
+class ValuesSerializerMixin:
+    """
+    Opts a read-only serializer into the ValuesListSerializer fast path.
+    `values_fields` maps every field to the lookup or expression its
+    value is read from.
+    """
+
+    values_fields = {}
+
+    @classmethod
+    def values_queryset(cls, queryset, fields=None):
+        """Projects the queryset on the serialized fields, or on `fields`"""
+        values_fields = {
+            name: expression
+            for name, expression in cls.values_fields.items()
+            if fields is None or name in fields
+        }
+        columns = [
+            name
+            for name, expression in values_fields.items()
+            if expression == name
+        ]
+        expressions = {
+            name: F(expression) if isinstance(expression, str) else expression
+            for name, expression in values_fields.items()
+            if expression != name
+        }
+        return queryset.values(*columns, **expressions)
+
+
+class ValuesListSerializer(serializers.ListSerializer):
+    """
+    Lists of ValuesSerializerMixin serializers. Querysets are read with
+    values(), and rows become dicts directly, without attribute
+    traversal or a to_representation call per field.
+    """
+
+    # fields whose to_representation would return database values as is
+    passthrough_fields = (
+        serializers.BooleanField,
+        serializers.CharField,
+        serializers.IntegerField,
+    )
+
+    def to_representation(self, data):
+        if isinstance(data, Manager):
+            data = data.all()
+        if isinstance(data, QuerySet):
+            data = self.child.values_queryset(data)
+
+        converters = {
+            name: field.to_representation
+            for name, field in self.child.fields.items()
+            if not isinstance(field, self.passthrough_fields)
+        }
+        return [
+            self.row_to_representation(row, converters)
+            if isinstance(row, dict)
+            else self.child.to_representation(row)
+            for row in data
+        ]
+
+    def row_to_representation(self, row, converters):
+        representation = {}
+        for name in self.child.fields:
+            value = row[name]
+            if value is not None and name in converters:
+                value = converters[name](value)
+            representation[name] = value
+        return representation
+
+
+class ShowSessionListSerializer(
+    ValuesSerializerMixin,
+    serializers.ModelSerializer
+):
     astronomy_show_title = serializers.CharField(
         source="astronomy_show.title",
         read_only=True
@@ -64,6 +322,20 @@ class ShowSessionListSerializer(serializers.ModelSerializer):
     )
     tickets_available = serializers.IntegerField(read_only=True)
 
+    values_fields = {
+        "id": "id",
+        "show_time": "show_time",
+        "astronomy_show_title": "astronomy_show__title",
+        "planetarium_dome_name": "planetarium_dome__name",
+        "planetarium_dome_capacity": (
+            F("planetarium_dome__rows") * F("planetarium_dome__seats_in_row")
+        ),
+        "tickets_available": (
+            F("planetarium_dome__rows") * F("planetarium_dome__seats_in_row")
+            - F("tickets_sold")
+        ),
+    }
+
     class Meta:
         model = ShowSession
         fields = (
@@ -74,35 +346,137 @@ class ShowSessionListSerializer(serializers.ModelSerializer):
             "planetarium_dome_capacity",
             "tickets_available"
         )
+        list_serializer_class = ValuesListSerializer
+
+
+def ticket_place(ticket_data):
+    return (
+        ticket_data["show_session"].id,
+        ticket_data["row"],
+        ticket_data["seat"],
+    )
+
+
+def contended_show_sessions(tickets_data):
+    return {
+        ticket_data["show_session"]
+        for ticket_data in tickets_data
+        if ticket_data["show_session"].high_contention
+    }
+
+
+def validate_seats(tickets_data):
+    """
+    Range-checks every requested seat against its dome and reports all
+    invalid, taken or repeated seats at once, one error per seat
+    """
+    for show_session in contended_show_sessions(tickets_data):
+        if show_session.is_sold_out:
+            raise ShowSessionSoldOut()
+
+    taken = Ticket.taken_places(
+        ticket_place(ticket_data) for ticket_data in tickets_data
+    )
+    requested = set()
+    errors = []
+
+    for ticket_data in tickets_data:
+        place = ticket_place(ticket_data)
+        try:
+            Ticket.validate_ticket(
+                ticket_data["row"],
+                ticket_data["seat"],
+                ticket_data["show_session"].planetarium_dome,
+                serializers.ValidationError,
+            )
+        except serializers.ValidationError as error:
+            errors.append(error.detail)
+            continue
+
+        if place in taken:
+            errors.append({"seat": "This seat is already taken"})
+        elif place in requested:
+            errors.append({"seat": "This seat is requested twice"})
+        else:
+            errors.append({})
+        requested.add(place)
+
+    if any(errors):
+        raise serializers.ValidationError(errors)
+    return tickets_data
+
+
+class ShowSessionRelatedField(serializers.PrimaryKeyRelatedField):
+    """Looks up every show session once, however many tickets refer to it"""
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault(
+            "queryset",
+            ShowSession.objects.select_related("planetarium_dome")
+        )
+        super().__init__(**kwargs)
+        self._show_sessions = {}
+
+    def to_internal_value(self, data):
+        if not isinstance(data, (str, int)):
+            return super().to_internal_value(data)
+
+        key = str(data)
+        if key not in self._show_sessions:
+            self._show_sessions[key] = super().to_internal_value(data)
+        return self._show_sessions[key]
 
 
 class TicketSerializer(serializers.ModelSerializer):
+    show_session = ShowSessionRelatedField()
+
     class Meta:
         model = Ticket
         fields = ("id", "row", "seat", "show_session")
+        # seats are validated in bulk by ReservationSerializer
+        validators = []
 
 
 class TicketListSerializer(TicketSerializer):
     show_session = ShowSessionListSerializer(many=False, read_only=True)
 
 
-class TicketDetailSerializer(TicketSerializer):
-    class Meta:
-        model = Ticket
-        fields = ("row", "seat")
-
-
 class ShowSessionDetailSerializer(ShowSessionSerializer):
     astronomy_show = AstronomyShowListSerializer(many=False, read_only=True)
     planetarium_dome = PlanetariumDomeSerializer(many=False, read_only=True)
-    taken_places = TicketDetailSerializer(
-        source="tickets", many=True, read_only=True
-    )
+    taken_places = serializers.SerializerMethodField()
 
     class Meta:
         model = ShowSession
         fields = ("id", "show_time", "astronomy_show", "planetarium_dome", "taken_places")
 
+    def get_taken_places(self, show_session):
+        return [
+            {"row": row, "seat": seat}
+            for row, seat in show_session.taken_seats()
+        ]
+
+
+class ShowSessionSeatMapSerializer(ShowSessionDetailSerializer):
+    taken_places = None
+    seat_map = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ShowSession
+        fields = ("id", "show_time", "astronomy_show", "planetarium_dome", "seat_map")
+
+    def get_seat_map(self, show_session):
+        encoding = self.context["seat_map_encoding"]
+        dome = show_session.planetarium_dome
+        return {
+            "encoding": encoding,
+            "rows": dome.rows,
+            "seats_in_row": dome.seats_in_row,
+            "data": ENCODERS[encoding](
+                dome.rows, dome.seats_in_row, show_session.taken_seats()
+            ),
+        }
+
 
 class ReservationSerializer(serializers.ModelSerializer):
     tickets = TicketSerializer(many=True, read_only=False, allow_empty=False)
@@ -111,14 +485,219 @@ class ReservationSerializer(serializers.ModelSerializer):
         model = Reservation
         fields = ("id", "tickets", "created_at")
 
+    def validate_tickets(self, tickets_data):
+        return validate_seats(tickets_data)
+
     def create(self, validated_data):
-        with transaction.atomic():
-            tickets_data = validated_data.pop("tickets")
-            reservation = Reservation.objects.create(**validated_data)
-            for ticket_data in tickets_data:
-                Ticket.objects.create(reservation=reservation, **ticket_data)
-            return reservation
+        tickets_data = validated_data.pop("tickets")
+        contended = contended_show_sessions(tickets_data)
+
+        with transaction.atomic(), show_session_locks(
+            show_session.id for show_session in contended
+        ):
+            return self.create_reservation(validated_data, tickets_data)
+
+    def create_reservation(self, validated_data, tickets_data):
+        reservation = Reservation.objects.create(**validated_data)
+        # rows are inserted and counters updated in (show_session, row,
+        # seat) order, so overlapping baskets wait instead of deadlocking
+        tickets = [
+            Ticket(reservation=reservation, **ticket_data)
+            for ticket_data in sorted(tickets_data, key=ticket_place)
+        ]
+        try:
+            with transaction.atomic():
+                Ticket.objects.bulk_create(tickets)
+        except IntegrityError:
+            # another reservation took some of the seats after validation
+            try:
+                validate_seats(tickets_data)
+            except serializers.ValidationError as error:
+                raise serializers.ValidationError({"tickets": error.detail})
+            raise
+        ShowSession.add_tickets_sold(
+            Counter(ticket.show_session_id for ticket in tickets)
+        )
+        send_seats_changed(
+            Ticket, taken=[ticket_place(data) for data in tickets_data]
+        )
+        return reservation
 
 
 class ReservationListSerializer(ReservationSerializer):
     tickets = TicketListSerializer(many=True, read_only=True)
+
+
+def conflict_report(tickets_data, errors):
+    """Regroups per-ticket errors into the conflicts of every show session"""
+    sessions = {}
+    for ticket_data, error in zip(tickets_data, errors):
+        show_session_id = ticket_data["show_session"].id
+        report = sessions.setdefault(
+            show_session_id, {"show_session": show_session_id, "conflicts": []}
+        )
+        if error:
+            report["conflicts"].append(
+                {"row": ticket_data["row"], "seat": ticket_data["seat"], "errors": error}
+            )
+    return [sessions[show_session_id] for show_session_id in sorted(sessions)]
+
+
+class BasketConflicts(APIException):
+    """
+    The conflict report of a basket. Unlike ValidationError the report is
+    kept as is, so show session ids, rows and seats stay integers.
+    """
+
+    status_code = status.HTTP_400_BAD_REQUEST
+    default_code = "invalid"
+
+    def __init__(self, report):
+        super().__init__()
+        self.detail = {"sessions": report}
+
+
+class SeatSerializer(serializers.Serializer):
+    row = serializers.IntegerField()
+    seat = serializers.IntegerField()
+
+
+class BasketItemSerializer(serializers.Serializer):
+    show_session = ShowSessionRelatedField()
+    seats = SeatSerializer(many=True, allow_empty=False)
+
+
+class BasketSerializer(serializers.Serializer):
+    """Books seats of several show sessions as one reservation"""
+
+    sessions = BasketItemSerializer(many=True, allow_empty=False)
+
+    @staticmethod
+    def tickets_data(sessions):
+        return [
+            {"show_session": item["show_session"], **seat_data}
+            for item in sessions
+            for seat_data in item["seats"]
+        ]
+
+    def validate_sessions(self, sessions):
+        tickets_data = self.tickets_data(sessions)
+        try:
+            validate_seats(tickets_data)
+        except serializers.ValidationError as error:
+            raise BasketConflicts(conflict_report(tickets_data, error.detail))
+        return sessions
+
+    def create(self, validated_data):
+        tickets_data = self.tickets_data(validated_data.pop("sessions"))
+        try:
+            return ReservationSerializer().create(
+                {
+                    "created_at": timezone.now(),
+                    "tickets": tickets_data,
+                    **validated_data,
+                }
+            )
+        except serializers.ValidationError as error:
+            raise BasketConflicts(
+                conflict_report(tickets_data, error.detail["tickets"])
+            )
+
+    def to_representation(self, instance):
+        return ReservationSerializer(instance, context=self.context).data
+
+
+class HeldSeatSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = HeldSeat
+        fields = ("row", "seat")
+
+
+class SeatHoldSerializer(serializers.ModelSerializer):
+    show_session = ShowSessionRelatedField()
+    seats = HeldSeatSerializer(many=True, allow_empty=False)
+    minutes = serializers.IntegerField(
+        write_only=True,
+        min_value=1,
+        max_value=settings.SEAT_HOLD_MAX_MINUTES,
+        default=settings.SEAT_HOLD_MINUTES,
+    )
+
+    class Meta:
+        model = SeatHold
+        fields = ("id", "show_session", "seats", "minutes", "expires_at")
+        read_only_fields = ("expires_at",)
+
+    @staticmethod
+    def seats_data(show_session, seats):
+        return [
+            {"show_session": show_session, **seat_data} for seat_data in seats
+        ]
+
+    def validate(self, attrs):
+        try:
+            validate_seats(self.seats_data(attrs["show_session"], attrs["seats"]))
+        except serializers.ValidationError as error:
+            raise serializers.ValidationError({"seats": error.detail})
+        return attrs
+
+    def create(self, validated_data):
+        show_session = validated_data["show_session"]
+        seats_data = self.seats_data(show_session, validated_data.pop("seats"))
+        minutes = validated_data.pop("minutes")
+        contended = contended_show_sessions(seats_data)
+
+        with transaction.atomic(), show_session_locks(
+            show_session.id for show_session in contended
+        ):
+            for expired in SeatHold.objects.filter(
+                show_session=show_session, expires_at__lte=timezone.now()
+            ).prefetch_related("seats"):
+                expired.release()
+            hold = SeatHold.objects.create(
+                expires_at=timezone.now() + timedelta(minutes=minutes),
+                **validated_data
+            )
+            try:
+                with transaction.atomic():
+                    HeldSeat.objects.bulk_create(
+                        HeldSeat(hold=hold, **seat_data)
+                        for seat_data in seats_data
+                    )
+            except IntegrityError:
+                # another hold took some of the seats after validation
+                try:
+                    validate_seats(seats_data)
+                except serializers.ValidationError as error:
+                    raise serializers.ValidationError({"seats": error.detail})
+                raise
+            send_seats_changed(
+                SeatHold, taken=[ticket_place(data) for data in seats_data]
+            )
+            return hold
+
+
+class TicketIntakeSerializer(serializers.Serializer):
+    row = serializers.IntegerField(min_value=1)
+    seat = serializers.IntegerField(min_value=1)
+    show_session = serializers.IntegerField(min_value=1)
+
+
+class ReservationIntakeSerializer(serializers.Serializer):
+    """Checks the shape of a reservation without touching the database"""
+
+    created_at = serializers.DateTimeField()
+    tickets = TicketIntakeSerializer(many=True, allow_empty=False)
+
+
+class ReservationRequestSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ReservationRequest
+        fields = (
+            "id",
+            "status",
+            "errors",
+            "reservation",
+            "created_at",
+            "processed_at"
+        )
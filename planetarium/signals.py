@@ -0,0 +1,32 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.dispatch import Signal
+
+# sent once the change is committed, with show_session_id and the
+# (row, seat) places that became taken or were released
+seats_changed = Signal()
+
+
+def send_on_commit(signal, sender, **kwargs):
+    transaction.on_commit(lambda: signal.send(sender=sender, **kwargs))
+
+
+def send_seats_changed(sender, taken=(), released=()):
+    """Sends seats_changed per show session for (show_session_id, row, seat) places"""
+    changes = defaultdict(lambda: ([], []))
+    for show_session_id, row, seat in taken:
+        changes[show_session_id][0].append((row, seat))
+    for show_session_id, row, seat in released:
+        changes[show_session_id][1].append((row, seat))
+
+    for show_session_id, (taken_places, released_places) in sorted(
+        changes.items()
+    ):
+        send_on_commit(
+            seats_changed,
+            sender=sender,
+            show_session_id=show_session_id,
+            taken=taken_places,
+            released=released_places,
+        )
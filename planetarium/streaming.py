@@ -0,0 +1,70 @@
+from itertools import chain, islice
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+
+def chunks(rows, size):
+    rows = iter(rows)
+    while chunk := list(islice(rows, size)):
+        yield chunk
+
+
+async def iterate_async(iterator):
+    """
+    Steps a blocking iterator in the thread of the request, one item at a
+    time, so an ASGI server can write each before the next is read
+    """
+    step = sync_to_async(next)
+    while (item := await step(iterator, None)) is not None:
+        yield item
+
+
+class StreamingListMixin:
+    """
+    Unpaginated JSON lists longer than one chunk are read in chunks,
+    from a server-side cursor where the database has them, and written
+    out chunk by chunk, so memory use does not grow with the table.
+    Lists that fit in one chunk are rendered as usual. Under ASGI the
+    chunks are handed over as an async iterator, a blocking one would be
+    read whole before the first byte is sent.
+    """
+
+    def can_stream(self):
+        return self.paginator is None and isinstance(
+            self.request.accepted_renderer, JSONRenderer
+        )
+
+    def list(self, request, *args, **kwargs):
+        if not self.can_stream():
+            return super().list(request, *args, **kwargs)
+
+        chunk_size = settings.STREAMING_LIST_CHUNK_SIZE
+        queryset = self.filter_queryset(self.get_queryset())
+        rows = queryset.iterator(chunk_size=chunk_size)
+        first = list(islice(rows, chunk_size + 1))
+        if len(first) <= chunk_size:
+            return Response(self.get_serializer(first, many=True).data)
+
+        content = self.stream_json(chain(first, rows), chunk_size)
+        if isinstance(request._request, ASGIRequest):
+            content = iterate_async(content)
+        return StreamingHttpResponse(
+            content, content_type=request.accepted_renderer.media_type
+        )
+
+    def stream_json(self, rows, chunk_size):
+        serializer = self.get_serializer(many=True).child
+        renderer = self.request.accepted_renderer
+        separator = b"["
+        for chunk in chunks(rows, chunk_size):
+            yield separator + b",".join(
+                renderer.render(serializer.to_representation(row))
+                for row in chunk
+            )
+            separator = b","
+        yield b"]"
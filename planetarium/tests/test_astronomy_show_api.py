@@ -1,20 +1,32 @@
+import json
+import subprocess
+import sys
 import tempfile
 import os
+from io import StringIO
 
 from PIL import Image
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from rest_framework.test import APIClient
 from rest_framework import status
 
+from planetarium.autocomplete import autocomplete_index, PrefixIndex
+from planetarium.images import delete_variants
 from planetarium.models import AstronomyShow, ShowTheme
 from planetarium.serializers import (
     AstronomyShowListSerializer,
 )
 
 ASTRONOMY_SHOW_URL = reverse("planetarium:astronomyshow-list")
+AUTOCOMPLETE_URL = reverse("planetarium:astronomyshow-autocomplete")
 
 
 def sample_astronomy_show(**params):
@@ -43,6 +55,7 @@ def image_upload_url(movie_id):
 
 class AstronomyShowImageUploadTests(TestCase):
     def setUp(self):
+        cache.clear()
         self.client = APIClient()
         self.user = get_user_model().objects.create_superuser(
             "admin@myproject.com", "password"
@@ -109,8 +122,74 @@ class AstronomyShowImageUploadTests(TestCase):
         self.assertIn("image", res.data[0].keys())
 
 
+@override_settings(IMAGE_VARIANT_WORKERS=0)
+class AstronomyShowImageVariantsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_superuser(
+            "admin@myproject.com", "password"
+        )
+        self.client.force_authenticate(self.user)
+        self.show = sample_astronomy_show()
+
+    def tearDown(self):
+        self.show.refresh_from_db()
+        delete_variants(self.show.image_variants)
+        self.show.image.delete()
+
+    def upload_image(self):
+        with tempfile.NamedTemporaryFile(suffix=".jpg") as ntf:
+            Image.new("RGB", (1000, 500)).save(ntf, format="JPEG")
+            ntf.seek(0)
+            return self.client.post(
+                image_upload_url(self.show.id), {"image": ntf}, format="multipart"
+            )
+
+    def test_variants_are_listed_once_rendered(self):
+        url = reverse("planetarium:astronomyshow-detail", args=[self.show.id])
+        self.upload_image()
+
+        self.assertEqual(self.client.get(url).data["image_variants"], {})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.upload_image()
+        res = self.client.get(url)
+        self.show.refresh_from_db()
+
+        self.assertEqual(
+            set(res.data["image_variants"]), {"thumbnail", "card", "hero"}
+        )
+        self.assertTrue(
+            res.data["image_variants"]["card"]["webp"].startswith("http://")
+        )
+        self.assertEqual(
+            self.client.get(ASTRONOMY_SHOW_URL).data[0]["image_variants"],
+            res.data["image_variants"]
+        )
+        thumbnail = self.show.image_variants["files"]["thumbnail"]
+        with Image.open(self.show.image.storage.path(thumbnail["webp"])) as image:
+            self.assertEqual((image.format, image.size), ("WEBP", (200, 100)))
+        with Image.open(self.show.image.storage.path(thumbnail["jpeg"])) as image:
+            self.assertEqual((image.format, image.size), ("JPEG", (200, 100)))
+
+    def test_backfill_command(self):
+        self.upload_image()
+
+        call_command(
+            "generate_image_variants", "--workers", "1", stdout=StringIO()
+        )
+
+        self.show.refresh_from_db()
+        self.assertEqual(
+            self.show.image_variants["source"], self.show.image.name
+        )
+        self.assertEqual(len(self.show.image_variants["files"]), 3)
+
+
 class UnauthenticatedAstronomyShowTest(TestCase):
     def setUp(self) -> None:
+        cache.clear()
         self.client = APIClient()
 
     def test_auth_required(self):
@@ -121,6 +200,7 @@ class UnauthenticatedAstronomyShowTest(TestCase):
 
 class AuthenticatedAstronomyShowTest(TestCase):
     def setUp(self) -> None:
+        cache.clear()
         self.client = APIClient()
         self.user = get_user_model().objects.create_user(
             "test@gmail.com",
@@ -153,6 +233,78 @@ class AuthenticatedAstronomyShowTest(TestCase):
         self.assertIn(serializer1.data, res.data)
         self.assertNotIn(serializer2.data, res.data)
 
+    def test_sparse_fieldset(self):
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(ASTRONOMY_SHOW_URL, {"fields": "id,title"})
+
+        self.assertEqual(
+            res.data,
+            [
+                {"id": self.show1.id, "title": "Show_1"},
+                {"id": self.show2.id, "title": "Show_2"},
+            ]
+        )
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn("description", queries[0]["sql"])
+        self.assertNotIn("image", queries[0]["sql"])
+
+    def test_themes_are_prefetched(self):
+        self.show1.show_themes.add(self.show_theme)
+        self.show2.show_themes.add(sample_show_theme(name="Venus"))
+        sample_astronomy_show(title="Show_3").show_themes.add(self.show_theme)
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(ASTRONOMY_SHOW_URL)
+
+        self.assertEqual(
+            [show["show_themes"] for show in res.data],
+            [["Mars"], ["Venus"], ["Mars"]]
+        )
+        self.assertEqual(len(queries), 2)
+        self.assertNotIn("planetarium_showtheme", queries[0]["sql"])
+
+        url = reverse("planetarium:astronomyshow-detail", args=[self.show1.id])
+        with self.assertNumQueries(2):
+            res = self.client.get(url)
+        self.assertEqual(
+            res.data["show_themes"], [{"id": self.show_theme.id, "name": "Mars"}]
+        )
+
+    @override_settings(STREAMING_LIST_CHUNK_SIZE=2)
+    def test_streamed_list_prefetches_themes_per_chunk(self):
+        self.show1.show_themes.add(self.show_theme)
+        sample_astronomy_show(title="Show_3").show_themes.add(self.show_theme)
+
+        # one cursor over the shows and a themes query for every chunk
+        with self.assertNumQueries(3):
+            res = self.client.get(ASTRONOMY_SHOW_URL)
+            data = json.loads(b"".join(res.streaming_content))
+
+        self.assertEqual(
+            [show["show_themes"] for show in data], [["Mars"], [], ["Mars"]]
+        )
+
+    def test_sparse_fieldset_unknown_field(self):
+        res = self.client.get(ASTRONOMY_SHOW_URL, {"fields": "id,price"})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("price", res.data["fields"])
+
+    def test_retrieve_astronomy_show_etag_follows_themes(self):
+        url = reverse("planetarium:astronomyshow-detail", args=[self.show1.id])
+        etag = self.client.get(url)["ETag"]
+
+        self.show1.show_themes.add(self.show_theme)
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        etag = res["ETag"]
+        self.show_theme.name = "Venus"
+        self.show_theme.save()
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["show_themes"][0]["name"], "Venus")
+
     def test_create_movie_forbidden(self):
         payload = {
             "title": "Sample astronomy show create",
@@ -164,8 +316,318 @@ class AuthenticatedAstronomyShowTest(TestCase):
         self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
 
 
+class AstronomyShowSearchTest(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "test@gmail.com",
+            "testpassword123"
+        )
+        self.client.force_authenticate(self.user)
+
+        self.galaxies = sample_astronomy_show(
+            title="Galaxies far away", description="A tour of deep space"
+        )
+        self.planets = sample_astronomy_show(
+            title="Planets", description="From Mercury to the nearest galaxy"
+        )
+        self.moon = sample_astronomy_show(
+            title="The Moon", description="Craters and tides"
+        )
+        self.theme = sample_show_theme(name="Solar system")
+        self.planets.show_themes.add(self.theme)
+
+    def search(self, query, **params):
+        res = self.client.get(ASTRONOMY_SHOW_URL, {"search": query, **params})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res.data
+
+    def test_search_ranks_title_matches_first(self):
+        data = self.search("GALAXY")
+
+        self.assertEqual(data["count"], 2)
+        self.assertEqual(
+            [show["id"] for show in data["results"]],
+            [self.galaxies.id, self.planets.id]
+        )
+
+    def test_search_matches_every_word(self):
+        data = self.search("moon tides")
+
+        self.assertEqual([show["id"] for show in data["results"]], [self.moon.id])
+
+    def test_search_theme_names(self):
+        self.assertEqual(self.search("solar")["results"][0]["id"], self.planets.id)
+
+        self.theme.name = "Outer planets"
+        self.theme.save()
+        self.moon.show_themes.add(self.theme)
+
+        self.assertEqual(self.search("solar")["count"], 0)
+        self.assertEqual(
+            {show["id"] for show in self.search("outer")["results"]},
+            {self.planets.id, self.moon.id}
+        )
+
+    def test_search_follows_changes(self):
+        self.moon.title = "Lunar eclipse"
+        self.moon.save()
+        self.galaxies.delete()
+
+        self.assertEqual(self.search("eclipse")["results"][0]["id"], self.moon.id)
+        self.assertEqual(self.search("far away")["count"], 0)
+
+    def test_rebuild_search_index(self):
+        AstronomyShow.objects.filter(pk=self.moon.pk).update(title="Lunar eclipse")
+        self.assertEqual(self.search("eclipse")["count"], 0)
+
+        call_command("rebuild_search_index", stdout=StringIO())
+
+        self.assertEqual(self.search("eclipse")["results"][0]["id"], self.moon.id)
+
+    def test_search_is_paginated(self):
+        data = self.search("galaxy", **{"page-size": 1})
+
+        self.assertEqual(data["count"], 2)
+        self.assertEqual(len(data["results"]), 1)
+        self.assertIsNotNone(data["next"])
+
+    def test_search_input_is_not_query_syntax(self):
+        self.assertEqual(self.search('"moon" OR NEAR(*')["count"], 0)
+        self.assertEqual(self.search("  ")["count"], 0)
+
+
+class ThemeFacetTest(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "test@gmail.com",
+            "testpassword123"
+        )
+        self.client.force_authenticate(self.user)
+
+        self.planets = sample_show_theme(name="Planets")
+        self.stars = sample_show_theme(name="Stars")
+        self.comets = sample_show_theme(name="Comets")
+        self.solar = sample_astronomy_show(title="Solar system")
+        self.solar.show_themes.add(self.planets, self.stars)
+        self.mars = sample_astronomy_show(title="Mars")
+        self.mars.show_themes.add(self.planets)
+        self.sirius = sample_astronomy_show(title="Sirius")
+        self.sirius.show_themes.add(self.stars)
+
+    def ids(self, data):
+        return [show["id"] for show in data]
+
+    def test_any_theme_matches_each_show_once(self):
+        res = self.client.get(
+            ASTRONOMY_SHOW_URL,
+            {"show-themes": f"{self.planets.id},{self.stars.id}"}
+        )
+
+        self.assertEqual(
+            self.ids(res.data), [self.solar.id, self.mars.id, self.sirius.id]
+        )
+
+    def test_theme_filter_is_a_subquery(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(
+                ASTRONOMY_SHOW_URL,
+                {"show-themes": f"{self.planets.id},{self.stars.id}"}
+            )
+
+        [sql] = [
+            query["sql"]
+            for query in queries.captured_queries
+            if "planetarium_astronomyshow_show_themes" in query["sql"]
+            and "EXISTS" in query["sql"]
+        ]
+        self.assertNotIn('"planetarium_astronomyshow"."id" IN', sql)
+
+    def test_all_themes_must_match(self):
+        res = self.client.get(
+            ASTRONOMY_SHOW_URL,
+            {
+                "show-themes": f"{self.planets.id},{self.stars.id}",
+                "show-themes-match": "all",
+            }
+        )
+
+        self.assertEqual(self.ids(res.data), [self.solar.id])
+
+        res = self.client.get(
+            ASTRONOMY_SHOW_URL,
+            {"show-themes": f"{self.planets.id}", "show-themes-match": "most"}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_facet_counts(self):
+        res = self.client.get(ASTRONOMY_SHOW_URL, {"facets": "show-themes"})
+
+        self.assertEqual(len(res.data["results"]), 3)
+        self.assertEqual(
+            res.data["facets"]["show_themes"],
+            [
+                {"id": self.planets.id, "name": "Planets", "count": 2},
+                {"id": self.stars.id, "name": "Stars", "count": 2},
+                {"id": self.comets.id, "name": "Comets", "count": 0},
+            ]
+        )
+
+        res = self.client.get(
+            ASTRONOMY_SHOW_URL,
+            {"show-themes": f"{self.planets.id}", "facets": "show-themes"}
+        )
+
+        self.assertEqual(
+            [facet["count"] for facet in res.data["facets"]["show_themes"]],
+            [2, 1, 0]
+        )
+
+    def test_facet_counts_follow_title_filter(self):
+        res = self.client.get(
+            ASTRONOMY_SHOW_URL, {"title": "Mars", "facets": "show-themes"}
+        )
+
+        self.assertEqual(self.ids(res.data["results"]), [self.mars.id])
+        self.assertEqual(
+            res.data["facets"]["show_themes"],
+            [
+                {"id": self.planets.id, "name": "Planets", "count": 1},
+                {"id": self.comets.id, "name": "Comets", "count": 0},
+                {"id": self.stars.id, "name": "Stars", "count": 0},
+            ]
+        )
+
+    def test_facet_counts_follow_theme_changes(self):
+        self.client.get(ASTRONOMY_SHOW_URL, {"facets": "show-themes"})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.sirius.show_themes.add(self.comets)
+            self.mars.delete()
+
+        res = self.client.get(ASTRONOMY_SHOW_URL, {"facets": "show-themes"})
+
+        self.assertEqual(
+            res.data["facets"]["show_themes"],
+            [
+                {"id": self.stars.id, "name": "Stars", "count": 2},
+                {"id": self.comets.id, "name": "Comets", "count": 1},
+                {"id": self.planets.id, "name": "Planets", "count": 1},
+            ]
+        )
+
+
+class AutocompleteTest(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        autocomplete_index.index = None
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "test@gmail.com",
+            "testpassword123"
+        )
+        self.client.force_authenticate(self.user)
+
+        self.galaxies = sample_astronomy_show(title="Galaxies far away")
+        self.gas = sample_astronomy_show(title="Gas giants")
+        self.dark = sample_astronomy_show(title="Dark galaxy")
+        self.theme = sample_show_theme(name="Galactic center")
+
+    def complete(self, prefix, **params):
+        res = self.client.get(AUTOCOMPLETE_URL, {"q": prefix, **params})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [(match["type"], match["id"]) for match in res.data]
+
+    def test_labels_starting_with_prefix_come_first(self):
+        self.assertEqual(
+            self.complete("gala"),
+            [
+                ("show_theme", self.theme.id),
+                ("astronomy_show", self.galaxies.id),
+                ("astronomy_show", self.dark.id),
+            ]
+        )
+        self.assertEqual(len(self.complete("ga", limit=2)), 2)
+        self.assertEqual(
+            self.complete("far AWAY"), [("astronomy_show", self.galaxies.id)]
+        )
+        self.assertEqual(self.complete(""), [])
+
+    def test_search_does_not_touch_the_database(self):
+        self.complete("gas")
+
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                self.complete("gas"), [("astronomy_show", self.gas.id)]
+            )
+
+    def test_index_follows_saves_and_deletes(self):
+        self.complete("gas")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.gas.title = "Ice giants"
+            self.gas.save()
+            nebulae = sample_astronomy_show(title="Gaseous nebulae")
+            self.galaxies.delete()
+
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                self.complete("ga"),
+                [
+                    ("show_theme", self.theme.id),
+                    ("astronomy_show", nebulae.id),
+                    ("astronomy_show", self.dark.id),
+                ]
+            )
+
+    def test_change_of_another_process_rebuilds_the_index(self):
+        self.complete("gas")
+        # committed by another process, only the shared counter tells
+        AstronomyShow.objects.filter(pk=self.gas.pk).update(title="Ice giants")
+        subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                "import django; django.setup(); "
+                "from planetarium.autocomplete import autocomplete_index; "
+                "autocomplete_index.count_change()",
+            ],
+            cwd=settings.BASE_DIR,
+            check=True,
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.dark.title = "Gas nebula"
+            self.dark.save()
+
+        self.assertEqual(
+            self.complete("gas"), [("astronomy_show", self.dark.id)]
+        )
+
+    def test_build_matches_incremental_index(self):
+        labels = [
+            ("astronomy_show", 2, "Dark galaxy"),
+            ("astronomy_show", 1, "Galaxies far away"),
+            ("show_theme", 1, "Galactic center"),
+        ]
+        index = PrefixIndex()
+        for label in labels:
+            index.add(*label)
+
+        built = PrefixIndex.build(labels)
+
+        self.assertEqual(built.starts, index.starts)
+        self.assertEqual(built.words, index.words)
+        self.assertEqual(built.labels, index.labels)
+
+
 class AdminAstronomyShowTest(TestCase):
     def setUp(self) -> None:
+        cache.clear()
         self.client = APIClient()
         self.user = get_user_model().objects.create_user(
             "admin@gmail.com",
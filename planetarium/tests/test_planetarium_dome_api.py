@@ -1,11 +1,23 @@
+from io import StringIO
+
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
 from django.test import TestCase
 from django.urls import reverse
+from django.utils import timezone
 
 from rest_framework.test import APIClient
 from rest_framework import status
 
-from planetarium.models import PlanetariumDome
+from planetarium.models import (
+    AstronomyShow,
+    DomeSchedule,
+    PlanetariumDome,
+    Reservation,
+    ShowSession,
+    Ticket
+)
 from planetarium.serializers import PlanetariumDomeSerializer
 
 PLANETARIUM_DOME_URL = reverse("planetarium:planetariumdome-list")
@@ -22,8 +34,13 @@ def sample_planetarium_dome(**params):
     return PlanetariumDome.objects.create(**defaults)
 
 
+def schedule_url(dome_id):
+    return reverse("planetarium:planetariumdome-schedule", args=[dome_id])
+
+
 class UnauthorizedPlanetaryDomeTest(TestCase):
     def setUp(self) -> None:
+        cache.clear()
         self.client = APIClient()
 
     def test_auth_required(self):
@@ -34,6 +51,7 @@ class UnauthorizedPlanetaryDomeTest(TestCase):
 
 class AuthorizedPlanetariumDomeTest(TestCase):
     def setUp(self) -> None:
+        cache.clear()
         self.client = APIClient()
         self.user = get_user_model().objects.create_user(
             "test@gmail.com",
@@ -67,6 +85,7 @@ class AuthorizedPlanetariumDomeTest(TestCase):
 
 class AdminPlanetariumDome(TestCase):
     def setUp(self) -> None:
+        cache.clear()
         self.client = APIClient()
         self.user = get_user_model().objects.create_user(
             "admin@gmail.com",
@@ -93,3 +112,110 @@ class AdminPlanetariumDome(TestCase):
         self.assertEqual(res.status_code, status.HTTP_201_CREATED)
         for key in payload:
             self.assertEqual(payload[key], getattr(movie, key))
+
+
+class DomeScheduleTest(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "test@gmail.com",
+            "testpassword123"
+        )
+        self.client.force_authenticate(self.user)
+
+        self.dome = sample_planetarium_dome(rows=2, seats_in_row=5)
+        self.show = AstronomyShow.objects.create(
+            title="Sample astronomy show", description="Sample description"
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.session = ShowSession.objects.create(
+                astronomy_show=self.show,
+                planetarium_dome=self.dome,
+                show_time="2023-12-02T18:00:00Z"
+            )
+
+    def get_schedule(self, **params):
+        return self.client.get(
+            schedule_url(self.dome.id),
+            {"from": "2023-12-01", "to": "2023-12-03", **params}
+        )
+
+    def test_schedule_lists_every_day_of_the_range(self):
+        res = self.get_schedule()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["planetarium_dome"]["id"], self.dome.id)
+        self.assertEqual(
+            [day["date"] for day in res.data["days"]],
+            ["2023-12-01", "2023-12-02", "2023-12-03"]
+        )
+        self.assertEqual(res.data["days"][0]["sessions"], [])
+        self.assertEqual(
+            res.data["days"][1]["sessions"],
+            [{
+                "id": self.session.id,
+                "show_time": "2023-12-02T18:00:00Z",
+                "astronomy_show": self.show.id,
+                "astronomy_show_title": "Sample astronomy show",
+                "tickets_available": 10,
+            }]
+        )
+
+    def test_schedule_is_a_single_read(self):
+        with self.assertNumQueries(2):
+            self.get_schedule()
+
+    def test_schedule_follows_sold_tickets(self):
+        reservation = Reservation.objects.create(
+            user=self.user, created_at=timezone.now()
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            Ticket.objects.create(
+                reservation=reservation, show_session=self.session, row=1, seat=1
+            )
+
+        res = self.get_schedule()
+
+        self.assertEqual(res.data["days"][1]["sessions"][0]["tickets_available"], 9)
+
+    def test_schedule_follows_moved_and_renamed_sessions(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.session.show_time = "2023-12-03T10:00:00Z"
+            self.session.save()
+            self.show.title = "Renamed show"
+            self.show.save()
+
+        res = self.get_schedule()
+
+        self.assertEqual(res.data["days"][1]["sessions"], [])
+        self.assertEqual(
+            res.data["days"][2]["sessions"][0]["astronomy_show_title"],
+            "Renamed show"
+        )
+        self.assertEqual(DomeSchedule.objects.count(), 1)
+
+    def test_schedule_drops_deleted_sessions(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.session.delete()
+
+        self.assertFalse(DomeSchedule.objects.exists())
+
+    def test_schedule_range_is_validated(self):
+        self.assertEqual(
+            self.get_schedule(to="2024-02-01").status_code,
+            status.HTTP_400_BAD_REQUEST
+        )
+        self.assertEqual(
+            self.get_schedule(**{"from": "01.12.2023"}).status_code,
+            status.HTTP_400_BAD_REQUEST
+        )
+
+    def test_rebuild_dome_schedules(self):
+        DomeSchedule.objects.all().delete()
+
+        call_command("rebuild_dome_schedules", stdout=StringIO())
+
+        schedule = DomeSchedule.objects.get()
+        self.assertEqual(str(schedule.date), "2023-12-02")
+        self.assertEqual(schedule.sessions[0]["id"], self.session.id)
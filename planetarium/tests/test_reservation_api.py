@@ -0,0 +1,484 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, DatabaseError
+from django.db.transaction import TransactionManagementError
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework.test import APIClient
+from rest_framework import status
+
+from planetarium.intake import process_batch
+from planetarium.locks import show_session_locks
+from planetarium.models import (
+    IdempotencyKey,
+    ReservationRequest,
+    AstronomyShow,
+    PlanetariumDome,
+    ShowSession,
+    Reservation,
+    Ticket
+)
+from planetarium.serializers import ReservationSerializer
+
+RESERVATION_URL = reverse("planetarium:reservation-list")
+BASKET_URL = reverse("planetarium:reservation-basket")
+
+
+def sample_show_session(**params):
+    defaults = {
+        "astronomy_show": AstronomyShow.objects.create(
+            title="Sample astronomy show",
+            description="Sample description",
+        ),
+        "planetarium_dome": PlanetariumDome.objects.create(
+            name="Sample planetarium dome",
+            rows=10,
+            seats_in_row=20,
+        ),
+        "show_time": "2023-12-12T10:00:00Z"
+    }
+    defaults.update(params)
+
+    return ShowSession.objects.create(**defaults)
+
+
+def sample_reservation(user, show_session, places):
+    reservation = Reservation.objects.create(
+        user=user,
+        created_at="2023-12-01T10:00:00Z"
+    )
+    for row, seat in places:
+        Ticket.objects.create(
+            reservation=reservation,
+            show_session=show_session,
+            row=row,
+            seat=seat
+        )
+    return reservation
+
+
+def tickets_payload(show_session, places):
+    return {
+        "created_at": "2023-12-01T10:00:00Z",
+        "tickets": [
+            {"row": row, "seat": seat, "show_session": show_session.id}
+            for row, seat in places
+        ],
+    }
+
+
+class UnauthenticatedReservationTest(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.client = APIClient()
+
+    def test_auth_required(self):
+        response = self.client.get(RESERVATION_URL)
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class AuthenticatedReservationTest(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "test@gmail.com",
+            "testpassword123"
+        )
+        self.session = sample_show_session()
+
+        self.client.force_authenticate(self.user)
+
+    def test_create_reservation(self):
+        payload = tickets_payload(self.session, [(1, 1), (1, 2), (2, 5)])
+
+        res = self.client.post(RESERVATION_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        reservation = Reservation.objects.get(id=res.data["id"])
+        self.assertEqual(reservation.user, self.user)
+        self.assertEqual(reservation.tickets.count(), 3)
+
+    def test_create_group_reservation_query_count(self):
+        payload = tickets_payload(
+            self.session, [(3, seat) for seat in range(1, 21)]
+        )
+
+        with self.assertNumQueries(10):
+            res = self.client.post(RESERVATION_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Ticket.objects.count(), 20)
+
+    def test_create_reservation_reports_every_conflicting_seat(self):
+        sample_reservation(self.user, self.session, [(1, 1), (1, 3)])
+        payload = tickets_payload(
+            self.session, [(1, 1), (1, 2), (1, 3), (11, 1), (1, 2)]
+        )
+
+        res = self.client.post(RESERVATION_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        errors = res.data["tickets"]
+        self.assertIn("seat", errors[0])
+        self.assertEqual(errors[1], {})
+        self.assertIn("seat", errors[2])
+        self.assertIn("row", errors[3])
+        self.assertIn("seat", errors[4])
+        self.assertEqual(Reservation.objects.count(), 1)
+        self.assertEqual(Ticket.objects.count(), 2)
+
+    def test_create_reservation_seat_out_of_range(self):
+        payload = tickets_payload(self.session, [(1, 21)])
+
+        res = self.client.post(RESERVATION_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("seat", res.data["tickets"][0])
+        self.assertFalse(Reservation.objects.exists())
+
+    def test_list_reservations_query_count(self):
+        other_session = sample_show_session()
+        for seat in range(1, 6):
+            sample_reservation(
+                self.user, self.session, [(1, seat), (2, seat)]
+            )
+            sample_reservation(self.user, other_session, [(1, seat)])
+
+        with self.assertNumQueries(4):
+            res = self.client.get(RESERVATION_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["count"], 10)
+        show_sessions = [
+            ticket["show_session"]
+            for reservation in res.data["results"]
+            for ticket in reservation["tickets"]
+        ]
+        self.assertTrue(show_sessions)
+        for show_session in show_sessions:
+            expected = 190 if show_session["id"] == self.session.id else 195
+            self.assertEqual(show_session["tickets_available"], expected)
+
+    def test_tickets_sold_counter(self):
+        payload = tickets_payload(self.session, [(1, 1), (1, 2)])
+        res = self.client.post(RESERVATION_URL, payload, format="json")
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.tickets_sold, 2)
+
+        Reservation.objects.get(id=res.data["id"]).delete()
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.tickets_sold, 0)
+
+    def test_reconcile_tickets_sold(self):
+        sample_reservation(self.user, self.session, [(1, 1), (1, 2)])
+        ShowSession.objects.update(tickets_sold=7)
+
+        call_command("reconcile_tickets_sold", stdout=StringIO())
+
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.tickets_sold, 2)
+
+
+class IdempotentReservationTest(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "test@gmail.com",
+            "testpassword123"
+        )
+        self.session = sample_show_session()
+
+        self.client.force_authenticate(self.user)
+
+    def post(self, payload, key):
+        return self.client.post(
+            RESERVATION_URL,
+            payload,
+            format="json",
+            HTTP_IDEMPOTENCY_KEY=key
+        )
+
+    def test_retry_replays_response(self):
+        payload = tickets_payload(self.session, [(1, 1), (1, 2)])
+        first = self.post(payload, "retry-1")
+
+        with self.assertNumQueries(1):
+            retry = self.post(payload, "retry-1")
+
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(Reservation.objects.count(), 1)
+
+    def test_key_reused_with_other_request(self):
+        self.post(tickets_payload(self.session, [(1, 1)]), "retry-1")
+
+        res = self.post(tickets_payload(self.session, [(1, 2)]), "retry-1")
+
+        self.assertEqual(res.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(Reservation.objects.count(), 1)
+
+    def test_invalid_request_is_not_stored(self):
+        payload = tickets_payload(self.session, [(1, 1)])
+        sample_reservation(self.user, self.session, [(1, 1)])
+
+        res = self.post(payload, "retry-1")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+    def test_purge_idempotency_keys(self):
+        self.post(tickets_payload(self.session, [(1, 1)]), "retry-1")
+        self.post(tickets_payload(self.session, [(1, 2)]), "retry-2")
+        IdempotencyKey.objects.filter(
+            key=IdempotencyKey.make_key(self.user, "retry-1")
+        ).update(expires_at=timezone.now())
+
+        call_command("purge_idempotency_keys", stdout=StringIO())
+
+        self.assertEqual(
+            list(IdempotencyKey.objects.values_list("key", flat=True)),
+            [IdempotencyKey.make_key(self.user, "retry-2")]
+        )
+
+
+class HighContentionReservationTest(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "test@gmail.com",
+            "testpassword123"
+        )
+        self.session = sample_show_session(high_contention=True)
+
+        self.client.force_authenticate(self.user)
+
+    def test_create_reservation(self):
+        payload = tickets_payload(self.session, [(1, 1), (1, 2)])
+
+        res = self.client.post(RESERVATION_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+    def test_create_reservation_with_idempotency_key(self):
+        payload = tickets_payload(self.session, [(1, 1)])
+
+        res = self.client.post(
+            RESERVATION_URL,
+            payload,
+            format="json",
+            HTTP_IDEMPOTENCY_KEY="retry-1"
+        )
+        replay = self.client.post(
+            RESERVATION_URL,
+            payload,
+            format="json",
+            HTTP_IDEMPOTENCY_KEY="retry-1"
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(replay.data, res.data)
+        self.assertEqual(Reservation.objects.count(), 1)
+        if connection.vendor == "postgresql":
+            # held until the transaction of the test ends, not the booking
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT count(*) FROM pg_locks "
+                    "WHERE locktype = 'advisory' AND pid = pg_backend_pid()"
+                )
+                self.assertEqual(cursor.fetchone(), (1,))
+
+    @override_settings(BOOKING_LOCK_TIMEOUT=0.01)
+    def test_busy_show_session(self):
+        payload = tickets_payload(self.session, [(1, 1)])
+
+        with show_session_locks([self.session.id], timeout=0):
+            res = self.client.post(RESERVATION_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertFalse(Reservation.objects.exists())
+
+    def test_sold_out_show_session(self):
+        ShowSession.objects.filter(pk=self.session.pk).update(tickets_sold=200)
+        payload = tickets_payload(self.session, [(1, 1)])
+
+        with self.assertNumQueries(1):
+            res = self.client.post(RESERVATION_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+
+
+class ShowSessionLocksTest(SimpleTestCase):
+    def test_locks_need_a_transaction(self):
+        with self.assertRaises(TransactionManagementError):
+            with show_session_locks([1]):
+                pass
+
+
+class AsyncReservationTest(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "test@gmail.com",
+            "testpassword123"
+        )
+        self.session = sample_show_session()
+
+        self.client.force_authenticate(self.user)
+
+    def post(self, payload):
+        return self.client.post(
+            RESERVATION_URL,
+            payload,
+            format="json",
+            HTTP_PREFER="respond-async"
+        )
+
+    def test_request_is_queued(self):
+        res = self.post(tickets_payload(self.session, [(1, 1)]))
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(res.data["status"], ReservationRequest.Status.PENDING)
+        self.assertEqual(res["Location"], res.data["url"])
+        self.assertFalse(Reservation.objects.exists())
+
+    def test_malformed_request_is_refused(self):
+        res = self.post({"created_at": "2023-12-01T10:00:00Z", "tickets": []})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(ReservationRequest.objects.exists())
+
+    def test_requests_are_processed_in_order(self):
+        first = self.post(tickets_payload(self.session, [(1, 1), (1, 2)]))
+        second = self.post(tickets_payload(self.session, [(1, 2), (1, 3)]))
+
+        self.assertEqual(process_batch(), 2)
+
+        res = self.client.get(first.data["url"])
+        self.assertEqual(res.data["status"], ReservationRequest.Status.CONFIRMED)
+        self.assertIsNotNone(res.data["reservation"])
+
+        res = self.client.get(second.data["url"])
+        self.assertEqual(res.data["status"], ReservationRequest.Status.REJECTED)
+        self.assertIn("seat", res.data["errors"]["tickets"][0])
+        self.assertEqual(res.data["errors"]["tickets"][1], {})
+        self.assertEqual(Ticket.objects.count(), 2)
+
+    def test_failing_request_does_not_block_the_queue(self):
+        first = self.post(tickets_payload(self.session, [(1, 1)]))
+        second = self.post(tickets_payload(self.session, [(1, 2)]))
+        save = ReservationSerializer.save
+
+        def fail_first(serializer, **kwargs):
+            if serializer.validated_data["tickets"][0]["seat"] == 1:
+                raise DatabaseError("connection reset")
+            return save(serializer, **kwargs)
+
+        with mock.patch.object(
+            ReservationSerializer, "save", fail_first
+        ), self.assertLogs("planetarium.intake", "ERROR"):
+            self.assertEqual(process_batch(), 2)
+
+        res = self.client.get(first.data["url"])
+        self.assertEqual(res.data["status"], ReservationRequest.Status.REJECTED)
+        self.assertIn("detail", res.data["errors"])
+
+        res = self.client.get(second.data["url"])
+        self.assertEqual(res.data["status"], ReservationRequest.Status.CONFIRMED)
+        self.assertEqual(Ticket.objects.count(), 1)
+
+    def test_process_reservation_requests_command(self):
+        self.post(tickets_payload(self.session, [(1, 1)]))
+
+        call_command("process_reservation_requests", once=True, stdout=StringIO())
+
+        self.assertEqual(Reservation.objects.count(), 1)
+        self.assertFalse(
+            ReservationRequest.objects.filter(
+                status=ReservationRequest.Status.PENDING
+            ).exists()
+        )
+
+
+class BasketReservationTest(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "test@gmail.com",
+            "testpassword123"
+        )
+        self.session1 = sample_show_session()
+        self.session2 = sample_show_session()
+
+        self.client.force_authenticate(self.user)
+
+    @staticmethod
+    def basket_payload(*items):
+        return {
+            "sessions": [
+                {
+                    "show_session": show_session.id,
+                    "seats": [{"row": row, "seat": seat} for row, seat in places],
+                }
+                for show_session, places in items
+            ]
+        }
+
+    def test_reserve_basket(self):
+        payload = self.basket_payload(
+            (self.session2, [(2, 2), (1, 1)]),
+            (self.session1, [(3, 1)]),
+        )
+
+        res = self.client.post(BASKET_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        reservation = Reservation.objects.get(id=res.data["id"])
+        self.assertEqual(reservation.user, self.user)
+        self.assertEqual(
+            list(
+                reservation.tickets.order_by("id").values_list(
+                    "show_session", "row", "seat"
+                )
+            ),
+            [
+                (self.session1.id, 3, 1),
+                (self.session2.id, 1, 1),
+                (self.session2.id, 2, 2),
+            ]
+        )
+        self.session2.refresh_from_db()
+        self.assertEqual(self.session2.tickets_sold, 2)
+
+    def test_basket_conflict_report(self):
+        sample_reservation(self.user, self.session2, [(1, 1)])
+        payload = self.basket_payload(
+            (self.session1, [(1, 1)]),
+            (self.session2, [(1, 1), (1, 2), (1, 99)]),
+        )
+
+        res = self.client.post(BASKET_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        report = res.json()["sessions"]
+        self.assertEqual(
+            report[0], {"show_session": self.session1.id, "conflicts": []}
+        )
+        self.assertEqual(report[1]["show_session"], self.session2.id)
+        self.assertEqual(
+            [(conflict["row"], conflict["seat"]) for conflict in report[1]["conflicts"]],
+            [(1, 1), (1, 99)]
+        )
+        self.assertEqual(Reservation.objects.count(), 1)
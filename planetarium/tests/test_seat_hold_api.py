@@ -0,0 +1,186 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework.test import APIClient
+from rest_framework import status
+
+from planetarium.models import HeldSeat, SeatHold, Ticket
+from planetarium.tests.test_reservation_api import (
+    RESERVATION_URL,
+    sample_show_session,
+    sample_reservation,
+    tickets_payload
+)
+
+SEAT_HOLD_URL = reverse("planetarium:seathold-list")
+
+
+def reserve_url(hold_id):
+    return reverse("planetarium:seathold-reserve", args=[hold_id])
+
+
+def hold_payload(show_session, places, **params):
+    payload = {
+        "show_session": show_session.id,
+        "seats": [{"row": row, "seat": seat} for row, seat in places],
+    }
+    payload.update(params)
+    return payload
+
+
+class SeatHoldTest(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "test@gmail.com",
+            "testpassword123"
+        )
+        self.session = sample_show_session()
+
+        self.client.force_authenticate(self.user)
+
+    def test_hold_seats(self):
+        res = self.client.post(
+            SEAT_HOLD_URL,
+            hold_payload(self.session, [(1, 1), (1, 2)], minutes=5),
+            format="json"
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        hold = SeatHold.objects.get(id=res.data["id"])
+        self.assertEqual(hold.seats.count(), 2)
+        self.assertGreater(hold.expires_at, timezone.now())
+
+    def test_hold_taken_seat(self):
+        sample_reservation(self.user, self.session, [(1, 1)])
+
+        res = self.client.post(
+            SEAT_HOLD_URL,
+            hold_payload(self.session, [(1, 1), (1, 2)]),
+            format="json"
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("seat", res.data["seats"][0])
+        self.assertEqual(res.data["seats"][1], {})
+
+    def test_held_seats_are_taken(self):
+        self.client.post(
+            SEAT_HOLD_URL, hold_payload(self.session, [(2, 3)]), format="json"
+        )
+
+        res = self.client.post(
+            RESERVATION_URL,
+            tickets_payload(self.session, [(2, 3)]),
+            format="json"
+        )
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        url = reverse("planetarium:showsession-detail", args=[self.session.id])
+        res = self.client.get(url)
+        self.assertEqual(res.data["taken_places"], [{"row": 2, "seat": 3}])
+
+    def test_expired_hold_releases_seats(self):
+        res = self.client.post(
+            SEAT_HOLD_URL, hold_payload(self.session, [(2, 3)]), format="json"
+        )
+        SeatHold.objects.filter(id=res.data["id"]).update(
+            expires_at=timezone.now() - timedelta(seconds=1)
+        )
+
+        res = self.client.post(
+            SEAT_HOLD_URL, hold_payload(self.session, [(2, 3)]), format="json"
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(SeatHold.objects.count(), 1)
+
+    def test_expired_hold_changes_show_session_etag(self):
+        self.client.post(
+            SEAT_HOLD_URL,
+            hold_payload(self.session, [(2, 3)], minutes=5),
+            format="json"
+        )
+        url = reverse("planetarium:showsession-detail", args=[self.session.id])
+        res = self.client.get(url)
+        self.assertEqual(res.data["taken_places"], [{"row": 2, "seat": 3}])
+
+        later = timezone.now() + timedelta(minutes=6)
+        with mock.patch("django.utils.timezone.now", return_value=later):
+            res = self.client.get(url, HTTP_IF_NONE_MATCH=res["ETag"])
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["taken_places"], [])
+
+    def test_reserve_hold(self):
+        res = self.client.post(
+            SEAT_HOLD_URL,
+            hold_payload(self.session, [(1, 1), (1, 2)]),
+            format="json"
+        )
+
+        res = self.client.post(reserve_url(res.data["id"]))
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(res.data["tickets"]), 2)
+        self.assertEqual(
+            set(Ticket.objects.values_list("row", "seat")), {(1, 1), (1, 2)}
+        )
+        self.assertFalse(SeatHold.objects.exists())
+        self.assertFalse(HeldSeat.objects.exists())
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.tickets_sold, 2)
+
+    def test_reserve_hold_with_seat_sold_meanwhile(self):
+        res = self.client.post(
+            SEAT_HOLD_URL,
+            hold_payload(self.session, [(1, 1), (1, 2)]),
+            format="json"
+        )
+        # sold by a path that does not look at holds
+        sample_reservation(self.user, self.session, [(1, 2)])
+
+        res = self.client.post(reserve_url(res.data["id"]))
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(res.data["seats"], [{"row": 1, "seat": 2}])
+        self.assertEqual(Ticket.objects.count(), 1)
+        self.assertTrue(SeatHold.objects.exists())
+
+    def test_reserve_expired_hold(self):
+        res = self.client.post(
+            SEAT_HOLD_URL, hold_payload(self.session, [(1, 1)]), format="json"
+        )
+        SeatHold.objects.filter(id=res.data["id"]).update(
+            expires_at=timezone.now() - timedelta(seconds=1)
+        )
+
+        res = self.client.post(reserve_url(res.data["id"]))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertFalse(Ticket.objects.exists())
+
+    def test_sweep_seat_holds(self):
+        for places in ([(1, 1)], [(1, 2)], [(1, 3)]):
+            self.client.post(
+                SEAT_HOLD_URL, hold_payload(self.session, places), format="json"
+            )
+        SeatHold.objects.filter(
+            seats__seat__in=[1, 2]
+        ).update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        call_command("sweep_seat_holds", batch_size=1, stdout=StringIO())
+
+        self.assertEqual(SeatHold.objects.count(), 1)
+        self.assertEqual(
+            list(HeldSeat.objects.values_list("seat", flat=True)), [3]
+        )
@@ -1,11 +1,37 @@
+import asyncio
+import base64
+import json
+import subprocess
+import sys
+import tempfile
+from io import StringIO
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.client import AsyncClient, Client
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
 from rest_framework import status
 
-from planetarium.models import AstronomyShow, PlanetariumDome, ShowSession
+from planetarium.models import (
+    AstronomyShow,
+    PlanetariumDome,
+    ShowSession,
+    Reservation,
+    ShowTheme,
+    Ticket
+)
+from planetarium.broadcast import InProcessBroker
+from planetarium.seating import FreeSeatIndex
+from planetarium.signals import send_seats_changed
 from planetarium.serializers import (
     ShowSessionSerializer,
     ShowSessionListSerializer,
@@ -13,6 +39,7 @@ from planetarium.serializers import (
 )
 
 SHOW_SESSION_URL = reverse("planetarium:showsession-list")
+SCHEDULE_URL = reverse("planetarium:showsession-schedule")
 
 
 def sample_planetarium_dome(**params):
@@ -49,6 +76,7 @@ def sample_show_session(**params):
 
 class UnauthenticatedShowSessionTest(TestCase):
     def setUp(self) -> None:
+        cache.clear()
         self.client = APIClient()
 
     def test_auth_required(self):
@@ -59,6 +87,7 @@ class UnauthenticatedShowSessionTest(TestCase):
 
 class AuthenticatedShowSessionTest(TestCase):
     def setUp(self) -> None:
+        cache.clear()
         self.client = APIClient()
         self.user = get_user_model().objects.create_user(
             "test@gmail.com",
@@ -77,6 +106,67 @@ class AuthenticatedShowSessionTest(TestCase):
         response = self.client.get(SHOW_SESSION_URL)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
+    def test_list_fast_path_matches_serializer(self):
+        reservation = Reservation.objects.create(
+            user=self.user, created_at="2023-12-01T10:00:00Z"
+        )
+        Ticket.objects.create(
+            reservation=reservation, show_session=self.session1, row=1, seat=1
+        )
+        show_sessions = ShowSession.objects.with_tickets_available().order_by(
+            "show_time", "id"
+        )
+        expected = ShowSessionListSerializer(
+            list(show_sessions), many=True
+        ).data
+
+        with self.assertNumQueries(1):
+            fast = ShowSessionListSerializer(show_sessions, many=True).data
+        res = self.client.get(SHOW_SESSION_URL)
+
+        self.assertEqual(fast, expected)
+        self.assertEqual(res.json()["results"], expected)
+        self.assertEqual(expected[0]["tickets_available"], 899)
+
+    def test_list_sparse_fieldset_drops_joins(self):
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(
+                SHOW_SESSION_URL, {"fields": "id,show_time", "count": "false"}
+            )
+
+        self.assertEqual(
+            res.json()["results"][0],
+            {"id": self.session1.id, "show_time": "2002-12-08T00:00:00Z"}
+        )
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn("JOIN", queries[0]["sql"])
+
+    def test_retrieve_sparse_fieldset(self):
+        url = reverse("planetarium:showsession-detail", args=[self.session1.id])
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(url, {"fields": "id,astronomy_show"})
+
+        self.assertEqual(set(res.data), {"id", "astronomy_show"})
+        self.assertEqual(res.data["astronomy_show"]["title"], "Sample astronomy show")
+        self.assertNotIn("planetarium_planetariumdome", queries[0]["sql"])
+
+    def test_retrieve_prefetches_show_themes(self):
+        self.session1.astronomy_show.show_themes.add(
+            ShowTheme.objects.create(name="Planets"),
+            ShowTheme.objects.create(name="Stars")
+        )
+        url = reverse("planetarium:showsession-detail", args=[self.session1.id])
+
+        # the next hold expiry, cached until holds change, the session with
+        # its show and dome, the themes and the taken seats
+        with self.assertNumQueries(4):
+            res = self.client.get(url)
+
+        self.assertEqual(
+            res.data["astronomy_show"]["show_themes"], ["Planets", "Stars"]
+        )
+
     def test_filter_show_sessions_by_date(self):
         res = self.client.get(SHOW_SESSION_URL, {"date": "2002-12-08"})
 
@@ -86,6 +176,32 @@ class AuthenticatedShowSessionTest(TestCase):
         self.assertContains(res, serializer1.data['show_time'])
         self.assertNotContains(res, serializer2.data['show_time'])
 
+    def test_filter_show_sessions_by_date_range(self):
+        first_day = sample_show_session(show_time="2023-12-01T00:00:00Z")
+        last_day = sample_show_session(show_time="2023-12-07T23:59:59Z")
+        sample_show_session(show_time="2023-11-30T23:59:59Z")
+        sample_show_session(show_time="2023-12-08T00:00:00Z")
+
+        res = self.client.get(
+            SHOW_SESSION_URL, {"from": "2023-12-01", "to": "2023-12-07"}
+        )
+
+        ids = [session["id"] for session in res.data["results"]]
+        self.assertEqual(ids, [first_day.id, last_day.id])
+
+        for params in ({"from": "2023-12"}, {"to": "12/07/2023"}):
+            res = self.client.get(SHOW_SESSION_URL, params)
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(TIME_ZONE="Europe/Kyiv")
+    def test_filter_show_sessions_by_local_date(self):
+        late_evening = sample_show_session(show_time="2023-12-01T22:30:00Z")
+
+        res = self.client.get(SHOW_SESSION_URL, {"date": "2023-12-02"})
+
+        ids = [session["id"] for session in res.data["results"]]
+        self.assertEqual(ids, [late_evening.id])
+
     def test_filter_show_sessions_by_astronomy_show(self):
         response = self.client.get(SHOW_SESSION_URL, {"astronomy-show": "1,2"})
         self.assertEqual(response.status_code, status.HTTP_200_OK)
@@ -94,9 +210,299 @@ class AuthenticatedShowSessionTest(TestCase):
         response = self.client.get(SHOW_SESSION_URL, {"planetarium-dome": "1,2"})
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
+    def test_retrieve_show_session_seat_map(self):
+        session = sample_show_session(
+            planetarium_dome=sample_planetarium_dome(rows=2, seats_in_row=5)
+        )
+        reservation = Reservation.objects.create(
+            user=self.user, created_at="2023-12-01T10:00:00Z"
+        )
+        for row, seat in [(1, 1), (1, 2), (2, 5)]:
+            Ticket.objects.create(
+                reservation=reservation, show_session=session, row=row, seat=seat
+            )
+        url = reverse("planetarium:showsession-detail", args=[session.id])
+
+        res = self.client.get(url, {"seat-map": "rle"})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn("taken_places", res.data)
+        self.assertEqual(res.data["seat_map"]["data"], [0, 2, 7, 1])
+
+        res = self.client.get(url, {"seat-map": "base64"})
+        bitmap = base64.b64decode(res.data["seat_map"]["data"])
+        self.assertEqual(bitmap, bytes([0b11000000, 0b01000000]))
+
+    def test_retrieve_show_session_unknown_seat_map(self):
+        url = reverse("planetarium:showsession-detail", args=[self.session1.id])
+
+        res = self.client.get(url, {"seat-map": "png"})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_list_show_sessions_with_cursor(self):
+        sessions = [self.session1, self.session2] + [
+            sample_show_session(show_time=f"2023-12-{day:02}T10:00:00Z")
+            for day in range(1, 10)
+        ]
+        expected = sorted(sessions, key=lambda session: (session.show_time, session.id))
+
+        ids = []
+        url = SHOW_SESSION_URL
+        while url:
+            res = self.client.get(url)
+            self.assertEqual(res.data["count"], 11)
+            ids += [session["id"] for session in res.data["results"]]
+            url = res.data["next"]
+
+        self.assertEqual(ids, [session.id for session in expected])
+
+    def test_list_show_sessions_without_count(self):
+        res = self.client.get(SHOW_SESSION_URL, {"count": "false"})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn("count", res.data)
+        self.assertEqual(len(res.data["results"]), 2)
+
+    def test_filter_show_sessions_by_availability(self):
+        small_dome = sample_planetarium_dome(rows=1, seats_in_row=2)
+        sold_out = sample_show_session(planetarium_dome=small_dome)
+        ShowSession.objects.filter(pk=sold_out.pk).update(tickets_sold=2)
+        almost_sold_out = sample_show_session(planetarium_dome=small_dome)
+        ShowSession.objects.filter(pk=almost_sold_out.pk).update(tickets_sold=1)
+
+        res = self.client.get(SHOW_SESSION_URL, {"sold-out": "true"})
+        ids = [session["id"] for session in res.data["results"]]
+        self.assertEqual(ids, [sold_out.id])
+
+        res = self.client.get(SHOW_SESSION_URL, {"min-available": 2})
+        ids = [session["id"] for session in res.data["results"]]
+        self.assertNotIn(sold_out.id, ids)
+        self.assertNotIn(almost_sold_out.id, ids)
+        self.assertIn(self.session1.id, ids)
+
+        res = self.client.get(SHOW_SESSION_URL, {"sold-out": "false"})
+        ids = [session["id"] for session in res.data["results"]]
+        self.assertIn(almost_sold_out.id, ids)
+        self.assertNotIn(sold_out.id, ids)
+
+        res = self.client.get(SHOW_SESSION_URL, {"min-available": "many"})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class FreeSeatIndexTest(TestCase):
+    def test_best_block_prefers_centre(self):
+        index = FreeSeatIndex(3, 9, [(2, 4), (2, 5)])
+
+        self.assertEqual(index.best_block(2), (2, [6, 7]))
+        self.assertEqual(index.best_block(4), (2, [6, 7, 8, 9]))
+        self.assertEqual(index.best_block(5), (1, [3, 4, 5, 6, 7]))
+
+    def test_best_block_not_found(self):
+        index = FreeSeatIndex(1, 4, [(1, 2)])
+
+        self.assertIsNone(index.best_block(3))
+
+
+class BestAvailableSeatsTest(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "test@gmail.com",
+            "testpassword123"
+        )
+        self.session = sample_show_session(
+            planetarium_dome=sample_planetarium_dome(rows=3, seats_in_row=6)
+        )
+        self.url = reverse(
+            "planetarium:showsession-best-available", args=[self.session.id]
+        )
+
+        self.client.force_authenticate(self.user)
+
+    def test_find_best_available(self):
+        res = self.client.get(self.url, {"count": 2})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, {"row": 2, "seats": [3, 4]})
+
+    def test_best_available_count_must_be_in_range(self):
+        for count in ("two", "0", "-1", "7"):
+            res = self.client.get(self.url, {"count": count})
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn("count", res.data)
+
+    def test_reserve_best_available(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post(f"{self.url}?count=3")
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            sorted(Ticket.objects.values_list("row", "seat")),
+            [(2, 2), (2, 3), (2, 4)]
+        )
+
+        res = self.client.get(self.url, {"count": 3})
+        self.assertEqual(res.data["row"], 1)
+
+    def test_reserve_best_available_with_stale_index(self):
+        FreeSeatIndex.get(self.session)
+        reservation = Reservation.objects.create(
+            user=self.user, created_at="2023-12-01T10:00:00Z"
+        )
+        Ticket.objects.create(
+            reservation=reservation, show_session=self.session, row=2, seat=3
+        )
+
+        res = self.client.post(f"{self.url}?count=2")
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Ticket.objects.count(), 3)
+
+    def test_no_adjacent_seats(self):
+        res = self.client.get(self.url, {"count": 7})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        reservation = Reservation.objects.create(
+            user=self.user, created_at="2023-12-01T10:00:00Z"
+        )
+        for row, seat in [(row, seat) for row in (1, 2, 3) for seat in (3, 5)]:
+            Ticket.objects.create(
+                reservation=reservation, show_session=self.session, row=row, seat=seat
+            )
+        cache.clear()
+
+        res = self.client.get(self.url, {"count": 3})
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+
+
+class ShowSessionCacheTest(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "test@gmail.com",
+            "testpassword123"
+        )
+        self.session = sample_show_session()
+        self.detail_url = reverse(
+            "planetarium:showsession-detail", args=[self.session.id]
+        )
+
+        self.client.force_authenticate(self.user)
+
+    def book(self, row, seat):
+        reservation = Reservation.objects.create(
+            user=self.user, created_at="2023-12-01T10:00:00Z"
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            Ticket.objects.create(
+                reservation=reservation,
+                show_session=self.session,
+                row=row,
+                seat=seat
+            )
+
+    def assert_cached(self, url, params=None):
+        first = self.client.get(url, params)
+        with self.assertNumQueries(0):
+            second = self.client.get(url, params)
+        self.assertEqual(first.data, second.data)
+        return second
+
+    def test_list_is_cached_per_query(self):
+        self.assert_cached(SHOW_SESSION_URL)
+        res = self.assert_cached(SHOW_SESSION_URL, {"count": "false"})
+
+        self.assertNotIn("count", res.data)
+
+    def test_tickets_invalidate_cached_responses(self):
+        self.assert_cached(SHOW_SESSION_URL)
+        self.assert_cached(self.detail_url)
+
+        self.book(1, 1)
+
+        res = self.client.get(SHOW_SESSION_URL)
+        self.assertEqual(res.data["results"][0]["tickets_available"], 899)
+        res = self.client.get(self.detail_url)
+        self.assertEqual(res.data["taken_places"], [{"row": 1, "seat": 1}])
+
+    def test_dome_change_invalidates_cached_responses(self):
+        self.assert_cached(self.detail_url)
+
+        dome = self.session.planetarium_dome
+        dome.name = "Renamed dome"
+        with self.captureOnCommitCallbacks(execute=True):
+            dome.save()
+
+        res = self.client.get(self.detail_url)
+        self.assertEqual(res.data["planetarium_dome"]["name"], "Renamed dome")
+
+    def test_queued_reservations_invalidate_cached_responses(self):
+        self.assert_cached(SHOW_SESSION_URL)
+        self.client.post(
+            reverse("planetarium:reservation-list"),
+            {
+                "created_at": "2023-12-01T10:00:00Z",
+                "tickets": [
+                    {"row": 1, "seat": 1, "show_session": self.session.id}
+                ],
+            },
+            format="json",
+            HTTP_PREFER="respond-async"
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command(
+                "process_reservation_requests", once=True, stdout=StringIO()
+            )
+
+        res = self.client.get(SHOW_SESSION_URL)
+        self.assertEqual(res.data["results"][0]["tickets_available"], 899)
+
+    def test_versions_bumped_by_another_process(self):
+        self.assert_cached(self.detail_url)
+        PlanetariumDome.objects.filter(
+            pk=self.session.planetarium_dome_id
+        ).update(name="Renamed dome")
+
+        # what a reservation worker or a management command does
+        subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                "import django; django.setup(); "
+                "from planetarium.models import ShowSession; "
+                "from planetarium.versions import bump, object_version; "
+                f"bump(object_version(ShowSession, {self.session.id}))",
+            ],
+            cwd=settings.BASE_DIR,
+            check=True,
+        )
+
+        res = self.client.get(self.detail_url)
+        self.assertEqual(res.data["planetarium_dome"]["name"], "Renamed dome")
+
+    def test_file_based_cache(self):
+        with tempfile.TemporaryDirectory() as cache_dir, override_settings(
+            CACHES={
+                "default": {
+                    "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                    "LOCATION": cache_dir,
+                }
+            }
+        ):
+            self.assert_cached(SHOW_SESSION_URL)
+            self.book(1, 1)
+
+            res = self.client.get(SHOW_SESSION_URL)
+            self.assertEqual(res.data["results"][0]["tickets_available"], 899)
+
 
 class AdminShowSessionTest(TestCase):
     def setUp(self) -> None:
+        cache.clear()
         self.client = APIClient()
         self.user = get_user_model().objects.create_user(
             "admin@gmail.com",
@@ -122,3 +528,214 @@ class AdminShowSessionTest(TestCase):
         res = self.client.post(SHOW_SESSION_URL, payload)
 
         self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+    def test_create_overlapping_show_session(self):
+        payload = {
+            "astronomy_show": self.show.id,
+            "planetarium_dome": self.session1.planetarium_dome_id,
+            "show_time": "2002-12-08T00:59:00Z"
+        }
+
+        res = self.client.post(SHOW_SESSION_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn(str(self.session1.id), res.data["show_time"][0])
+
+    def schedule_payload(self, **params):
+        payload = {
+            "astronomy_show": self.show.id,
+            "planetarium_dome": self.dome.id,
+            "date_from": "2024-01-01",
+            "date_to": "2024-01-14",
+            "weekdays": [5, 6],
+            "times": ["10:00", "12:00"],
+        }
+        payload.update(params)
+        return payload
+
+    def test_schedule_recurring_show_sessions(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post(
+                SCHEDULE_URL, self.schedule_payload(), format="json"
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            [session["show_time"] for session in res.data],
+            [
+                "2024-01-06T10:00:00Z",
+                "2024-01-06T12:00:00Z",
+                "2024-01-07T10:00:00Z",
+                "2024-01-07T12:00:00Z",
+                "2024-01-13T10:00:00Z",
+                "2024-01-13T12:00:00Z",
+                "2024-01-14T10:00:00Z",
+                "2024-01-14T12:00:00Z",
+            ]
+        )
+        self.assertEqual(self.dome.show_sessions.count(), 8)
+        self.assertEqual(self.dome.schedules.count(), 4)
+
+    def test_schedule_inserts_in_one_query(self):
+        payload = self.schedule_payload(
+            date_to="2024-01-28", weekdays=list(range(7)), times=["10:00", "14:00"]
+        )
+
+        # show and dome lookups, dome lock, longest duration, overlap
+        # index and one insert, in a savepoint
+        with self.assertNumQueries(8):
+            res = self.client.post(SCHEDULE_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(res.data), 56)
+
+    def test_schedule_reports_overlaps(self):
+        existing = sample_show_session(
+            astronomy_show=self.show,
+            planetarium_dome=self.dome,
+            show_time="2024-01-07T11:00:00Z"
+        )
+
+        res = self.client.post(
+            SCHEDULE_URL,
+            self.schedule_payload(times=["10:00", "10:30"]),
+            format="json"
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        conflicts = res.data["conflicts"]
+        self.assertEqual(len(conflicts), 5)
+        self.assertIn(str(existing.id), conflicts[2]["reason"])
+        self.assertEqual(self.dome.show_sessions.count(), 1)
+
+    def test_schedule_forbidden_for_users(self):
+        self.user.is_staff = False
+        self.user.save()
+
+        res = self.client.post(
+            SCHEDULE_URL, self.schedule_payload(), format="json"
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+
+def events_url(show_session_id):
+    return reverse("planetarium:showsession-events", args=[show_session_id])
+
+
+def parse_event(chunk):
+    if isinstance(chunk, bytes):
+        chunk = chunk.decode()
+    fields = dict(line.split(": ", 1) for line in chunk.strip().splitlines())
+    return fields["event"], json.loads(fields["data"])
+
+
+class InProcessBrokerTest(TestCase):
+    def test_publish_fans_out_to_channel_subscribers(self):
+        async def listen():
+            broker = InProcessBroker(queue_size=2)
+            with broker.subscribe("a") as first, broker.subscribe("a") as second:
+                with broker.subscribe("b") as other:
+                    broker.publish("a", 1)
+                    broker.publish("a", 2)
+                    broker.publish("a", 3)
+                    await asyncio.sleep(0)
+
+                    self.assertEqual(await first.get(), 1)
+                    self.assertEqual(await second.get(), 1)
+                    self.assertTrue(first.overflowed)
+                    self.assertTrue(other.queue.empty())
+            self.assertEqual(broker.subscribers("a"), 0)
+
+        asyncio.run(listen())
+
+
+class ShowSessionEventsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            "test@test.com",
+            "testpass"
+        )
+        self.session = sample_show_session(
+            planetarium_dome=sample_planetarium_dome(rows=2, seats_in_row=3)
+        )
+        reservation = Reservation.objects.create(
+            user=self.user, created_at="2023-12-01T10:00:00Z"
+        )
+        Ticket.objects.create(
+            reservation=reservation, show_session=self.session, row=1, seat=2
+        )
+        self.client = AsyncClient()
+        self.headers = {
+            "Authorization": f"Bearer {AccessToken.for_user(self.user)}"
+        }
+
+    def commit_seats_changed(self, taken, released):
+        with self.captureOnCommitCallbacks(execute=True):
+            send_seats_changed(Ticket, taken=taken, released=released)
+
+    async def test_auth_required(self):
+        res = await AsyncClient().get(events_url(self.session.id))
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    async def test_unknown_show_session(self):
+        res = await self.client.get(
+            events_url(self.session.id + 1), headers=self.headers
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(SEAT_EVENTS_KEEPALIVE=15)
+    def test_wsgi_sends_single_snapshot(self):
+        res = Client().get(
+            events_url(self.session.id),
+            HTTP_AUTHORIZATION=self.headers["Authorization"]
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertFalse(res.streaming)
+        self.assertEqual(res["Content-Type"], "text/event-stream")
+        retry, event = res.content.decode().split("\n", 1)
+        self.assertEqual(retry, "retry: 15000")
+        self.assertEqual(
+            parse_event(event), ("snapshot", {"taken": [{"row": 1, "seat": 2}]})
+        )
+
+    @override_settings(SEAT_EVENTS_MAX_AGE=0)
+    async def test_stream_ends_with_retry(self):
+        res = await self.client.get(
+            events_url(self.session.id), headers=self.headers
+        )
+
+        chunks = [chunk async for chunk in res.streaming_content]
+
+        self.assertEqual(parse_event(chunks[0])[0], "snapshot")
+        self.assertEqual(chunks[1:], [b"retry: 1000\n\n"])
+
+    async def test_stream_sends_snapshot_then_changes(self):
+        res = await self.client.get(
+            events_url(self.session.id), headers=self.headers
+        )
+        self.assertEqual(res["Content-Type"], "text/event-stream")
+        events = aiter(res.streaming_content)
+
+        self.assertEqual(
+            parse_event(await anext(events)),
+            ("snapshot", {"taken": [{"row": 1, "seat": 2}]})
+        )
+
+        await sync_to_async(self.commit_seats_changed)(
+            taken=[(self.session.id, 2, 1)],
+            released=[(self.session.id, 1, 2)]
+        )
+
+        self.assertEqual(
+            parse_event(await anext(events)),
+            ("seats", {
+                "show_session": self.session.id,
+                "taken": [{"row": 2, "seat": 1}],
+                "released": [{"row": 1, "seat": 2}],
+            })
+        )
@@ -1,8 +1,13 @@
+import json
+
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.test.client import AsyncClient
 from django.urls import reverse
 
 from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
 from rest_framework import status
 
 from planetarium.models import ShowTheme
@@ -22,6 +27,7 @@ def sample_show_theme(**params):
 
 class UnauthorizedShowThemeTest(TestCase):
     def setUp(self) -> None:
+        cache.clear()
         self.client = APIClient()
 
     def test_auth_required(self):
@@ -32,6 +38,7 @@ class UnauthorizedShowThemeTest(TestCase):
 
 class AuthorizedShowThemeTest(TestCase):
     def setUp(self) -> None:
+        cache.clear()
         self.client = APIClient()
         self.user = get_user_model().objects.create_user(
             "test@gmail.com",
@@ -52,6 +59,80 @@ class AuthorizedShowThemeTest(TestCase):
         self.assertEqual(len(res.data), 2)
         self.assertEqual(res.data, serializer.data)
 
+    @override_settings(STREAMING_LIST_CHUNK_SIZE=2)
+    def test_list_longer_than_a_chunk_is_streamed(self):
+        sample_show_theme(name="show theme 3")
+        sample_show_theme(name="show theme 4")
+        sample_show_theme(name="show theme 5")
+
+        res = self.client.get(PLANETARIUM_DOME_URL)
+
+        self.assertTrue(res.streaming)
+        self.assertEqual(res["Content-Type"], "application/json")
+        self.assertIn("ETag", res)
+        self.assertEqual(
+            json.loads(b"".join(res.streaming_content)),
+            ShowThemeSerializer(ShowTheme.objects.all(), many=True).data
+        )
+
+        res = self.client.get(PLANETARIUM_DOME_URL, {"fields": "name"})
+
+        self.assertEqual(
+            json.loads(b"".join(res.streaming_content))[4],
+            {"name": "show theme 5"}
+        )
+
+    @override_settings(STREAMING_LIST_CHUNK_SIZE=2)
+    async def test_list_is_streamed_asynchronously_under_asgi(self):
+        headers = {
+            "Authorization": f"Bearer {AccessToken.for_user(self.user)}"
+        }
+        for number in range(3, 6):
+            await ShowTheme.objects.acreate(name=f"show theme {number}")
+
+        res = await AsyncClient().get(PLANETARIUM_DOME_URL, headers=headers)
+
+        self.assertTrue(res.is_async)
+        chunks = [chunk async for chunk in res.streaming_content]
+        self.assertEqual(len(chunks), 4)
+        self.assertEqual(
+            [theme["name"] for theme in json.loads(b"".join(chunks))],
+            [f"show theme {number}" for number in range(1, 6)]
+        )
+
+    def test_list_theme_not_modified(self):
+        res = self.client.get(PLANETARIUM_DOME_URL)
+        etag = res["ETag"]
+
+        with self.assertNumQueries(0):
+            res = self.client.get(PLANETARIUM_DOME_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        res = self.client.get(
+            PLANETARIUM_DOME_URL, HTTP_IF_MODIFIED_SINCE=res["Last-Modified"]
+        )
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_list_theme_modified(self):
+        etag = self.client.get(PLANETARIUM_DOME_URL)["ETag"]
+        self.theme1.name = "renamed show theme"
+        self.theme1.save()
+
+        res = self.client.get(PLANETARIUM_DOME_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res["ETag"], etag)
+
+    def test_retrieve_theme_etag_per_object(self):
+        url = reverse("planetarium:showtheme-detail", args=[self.theme1.id])
+        etag = self.client.get(url)["ETag"]
+        self.theme2.name = "renamed show theme"
+        self.theme2.save()
+
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
     def test_create_theme_forbidden(self):
         payload = {
             "name": "Sample show theme test create",
@@ -64,6 +145,7 @@ class AuthorizedShowThemeTest(TestCase):
 
 class AdminShowTheme(TestCase):
     def setUp(self) -> None:
+        cache.clear()
         self.client = APIClient()
         self.user = get_user_model().objects.create_user(
             "admin@gmail.com",
@@ -0,0 +1,65 @@
+from bisect import bisect_left
+from datetime import datetime, timedelta
+
+from django.db.models import Max
+from django.utils import timezone
+
+from planetarium.models import AstronomyShow, ShowSession
+
+
+def expand_recurrence(date_from, date_to, weekdays, times):
+    """Yields aware show times on `weekdays` (Monday is 0) in date order"""
+    weekdays = set(weekdays)
+    times = sorted(set(times))
+    day = date_from
+    while day <= date_to:
+        if day.weekday() in weekdays:
+            for show_time in times:
+                yield timezone.make_aware(datetime.combine(day, show_time))
+        day += timedelta(days=1)
+
+
+class IntervalIndex:
+    """
+    Half-open [start, end) intervals sorted by start, with the interval
+    ending last among every prefix, so an overlap check is one bisect
+    """
+
+    def __init__(self, intervals):
+        intervals = sorted(intervals, key=lambda interval: interval[0])
+        self.starts = [start for start, _, _ in intervals]
+        self.latest_ends = []
+        for _, end, key in intervals:
+            if not self.latest_ends or end > self.latest_ends[-1][0]:
+                self.latest_ends.append((end, key))
+            else:
+                self.latest_ends.append(self.latest_ends[-1])
+
+    @classmethod
+    def for_dome(cls, planetarium_dome, start, end, exclude=None):
+        """Indexes the sessions of a dome that may overlap [start, end)"""
+        longest = AstronomyShow.objects.aggregate(
+            longest=Max("duration")
+        )["longest"] or 0
+        show_sessions = ShowSession.objects.filter(
+            planetarium_dome=planetarium_dome,
+            show_time__gte=start - timedelta(minutes=longest),
+            show_time__lt=end,
+        )
+        if exclude is not None:
+            show_sessions = show_sessions.exclude(pk=exclude)
+        return cls(
+            (show_time, show_time + timedelta(minutes=duration), show_session_id)
+            for show_session_id, show_time, duration in show_sessions.values_list(
+                "id", "show_time", "astronomy_show__duration"
+            )
+        )
+
+    def overlapping(self, start, end):
+        """Returns the key of an interval overlapping [start, end), or None"""
+        position = bisect_left(self.starts, end)
+        if position:
+            latest_end, key = self.latest_ends[position - 1]
+            if latest_end > start:
+                return key
+        return None
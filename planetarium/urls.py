@@ -1,12 +1,15 @@
 from django.urls import path, include
 from rest_framework import routers
 
+from planetarium.events import show_session_events
 from planetarium.views import (
     ShowThemeViewSet,
     PlanetariumDomeViewSet,
     AstronomyShowViewSet,
     ShowSessionViewSet,
-    ReservationViewSet
+    ReservationViewSet,
+    SeatHoldViewSet,
+    ReservationRequestViewSet
 )
 
 router = routers.DefaultRouter()
@@ -15,7 +18,16 @@ router.register("planetarium_domes", PlanetariumDomeViewSet)
 router.register("astronomy_show", AstronomyShowViewSet)
 router.register("show_sessions", ShowSessionViewSet)
 router.register("reservations", ReservationViewSet)
+router.register("seat_holds", SeatHoldViewSet)
+router.register("reservation_requests", ReservationRequestViewSet)
 
-urlpatterns = [path("", include(router.urls))]
+urlpatterns = [
+    path(
+        "show_sessions/<int:pk>/events/",
+        show_session_events,
+        name="showsession-events"
+    ),
+    path("", include(router.urls)),
+]
 
 app_name = "planetarium"
@@ -0,0 +1,54 @@
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+
+def collection_version(model):
+    return model._meta.label_lower
+
+
+def object_version(model, pk):
+    return f"{model._meta.label_lower}:{pk}"
+
+
+def version_key(name):
+    return f"planetarium:version:{name}"
+
+
+def get_versions(*names):
+    """
+    Returns the version stamp of every name. Stamps are nanosecond
+    timestamps of the last change, names seen for the first time (or
+    evicted from the cache) start at the current time.
+    """
+    keys = [version_key(name) for name in names]
+    versions = cache.get_many(keys)
+    missing = {key: time.time_ns() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, timeout=None)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+def bump(*names):
+    if names:
+        now = time.time_ns()
+        cache.set_many({version_key(name): now for name in names}, timeout=None)
+
+
+def bump_on_commit(*names):
+    """
+    Bumps now, so this process stops serving the old version right away,
+    and again after commit, dropping whatever was cached from data that
+    other processes read before the change was committed
+    """
+    bump(*names)
+    transaction.on_commit(lambda: bump(*names))
+
+
+def bump_objects(model, pks):
+    """Bumps the collection of `model` and every object in `pks`, on commit too"""
+    bump_on_commit(
+        collection_version(model), *(object_version(model, pk) for pk in pks)
+    )
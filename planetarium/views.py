@@ -1,25 +1,49 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 
-from django.db.models import F, Count
+from django.db import IntegrityError, transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+from django.utils.functional import cached_property
 from rest_framework import status, mixins,viewsets
 from rest_framework.decorators import action
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.authentication import (
+    JWTAuthentication,
+    JWTStatelessUserAuthentication
+)
 
+from planetarium.autocomplete import autocomplete_index
+from planetarium.caching import CachedResponseMixin, ConditionalGetMixin
+from planetarium.facets import THEME_MEMBERSHIP, ThemeMembership
+from planetarium.fieldsets import SparseFieldsMixin
+from planetarium.idempotency import IdempotentCreateMixin
+from planetarium.intake import ReservationIntakeMixin
 from planetarium.models import (
     ShowTheme,
     AstronomyShow,
     ShowSession,
     Reservation,
-    PlanetariumDome
+    PlanetariumDome,
+    SeatHold,
+    ReservationRequest,
+    Ticket,
+    DomeSchedule
 )
+from planetarium.occupancy import ENCODERS
+from planetarium.planning import QueryPlanMixin
 from planetarium.permissions import IsAdminOrIfAuthenticatedReadOnly
+from planetarium.schedules import day_start
+from planetarium.search import search_astronomy_shows
+from planetarium.seating import expire_holds, FreeSeatIndex
+from planetarium.streaming import StreamingListMixin
 
 from planetarium.serializers import (
     ShowThemeSerializer,
     PlanetariumDomeSerializer,
+    DomeScheduleSerializer,
     AstronomyShowSerializer,
     AstronomyShowDetailSerializer,
     AstronomyShowListSerializer,
@@ -27,8 +51,13 @@ from planetarium.serializers import (
     ShowSessionSerializer,
     ShowSessionListSerializer,
     ShowSessionDetailSerializer,
+    ShowSessionSeatMapSerializer,
+    ShowSessionScheduleSerializer,
     ReservationSerializer,
-    ReservationListSerializer
+    ReservationListSerializer,
+    BasketSerializer,
+    SeatHoldSerializer,
+    ReservationRequestSerializer
 )
 
 
@@ -37,12 +66,64 @@ def params_to_ints(qs):
     return [int(str_id) for str_id in qs.split(",")]
 
 
+def params_to_date(date):
+    return datetime.strptime(date, "%Y-%m-%d").date()
+
+
 class Pagination(PageNumberPagination):
     page_size = 5
     max_page_size = 100
 
 
+class SearchPagination(PageNumberPagination):
+    page_size = 20
+    page_size_query_param = "page-size"
+    max_page_size = 100
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination, every page costs the same as the first one.
+    The total count is included unless `?count=false` is passed.
+    """
+
+    page_size = 5
+    max_page_size = 100
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count = None
+        if request.query_params.get("count", "").lower() != "false":
+            self.count = queryset.count()
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        if self.count is not None:
+            response.data = {"count": self.count, **response.data}
+        return response
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema["properties"] = {
+            "count": {"type": "integer", "example": 123},
+            **response_schema["properties"],
+        }
+        return response_schema
+
+
+class ShowSessionPagination(KeysetPagination):
+    ordering = ("show_time", "id")
+
+
+class ReservationPagination(KeysetPagination):
+    ordering = ("-created_at", "-id")
+
+
 class ShowThemeViewSet(
+    SparseFieldsMixin,
+    QueryPlanMixin,
+    ConditionalGetMixin,
+    StreamingListMixin,
     mixins.ListModelMixin,
     mixins.RetrieveModelMixin,
     mixins.UpdateModelMixin,
@@ -57,6 +138,10 @@ class ShowThemeViewSet(
 
 
 class PlanetariumDomeViewSet(
+    SparseFieldsMixin,
+    QueryPlanMixin,
+    ConditionalGetMixin,
+    StreamingListMixin,
     mixins.ListModelMixin,
     mixins.RetrieveModelMixin,
     mixins.UpdateModelMixin,
@@ -69,9 +154,61 @@ class PlanetariumDomeViewSet(
 
     permission_classes = (IsAdminOrIfAuthenticatedReadOnly,)
 
+    SCHEDULE_DAYS = 7
+    MAX_SCHEDULE_DAYS = 31
+
+    def schedule_range(self):
+        try:
+            date_from = params_to_date(
+                self.request.query_params.get(
+                    "from", timezone.localdate().isoformat()
+                )
+            )
+            date_to = params_to_date(
+                self.request.query_params.get(
+                    "to",
+                    (date_from + timedelta(days=self.SCHEDULE_DAYS - 1)).isoformat()
+                )
+            )
+        except ValueError:
+            raise ValidationError("Dates must be in YYYY-MM-DD format")
+        days = (date_to - date_from).days + 1
+        if not 1 <= days <= self.MAX_SCHEDULE_DAYS:
+            raise ValidationError(
+                f"The range must cover 1 to {self.MAX_SCHEDULE_DAYS} days"
+            )
+        return [date_from + timedelta(days=day) for day in range(days)]
+
+    @action(
+        methods=["GET"],
+        detail=True,
+        url_path="schedule"
+    )
+    def schedule(self, request, pk=None):
+        """Sessions of the dome per day, a week from today by default"""
+        dates = self.schedule_range()
+        planetarium_dome = self.get_object()
+        schedules = {
+            schedule.date: schedule
+            for schedule in planetarium_dome.schedules.filter(
+                date__gte=dates[0], date__lte=dates[-1]
+            )
+        }
+        serializer = DomeScheduleSerializer(
+            [schedules.get(date, DomeSchedule(date=date)) for date in dates],
+            many=True
+        )
+        return Response({
+            "planetarium_dome": self.get_serializer(planetarium_dome).data,
+            "days": serializer.data,
+        })
 
 
 class AstronomyShowViewSet(
+    SparseFieldsMixin,
+    QueryPlanMixin,
+    ConditionalGetMixin,
+    StreamingListMixin,
     mixins.ListModelMixin,
     mixins.RetrieveModelMixin,
     mixins.UpdateModelMixin,
@@ -86,18 +223,96 @@ class AstronomyShowViewSet(
 
     def get_queryset(self):
         title = self.request.query_params.get("title")
-        show_themes = self.request.query_params.get("show-themes")
 
-        queryset = self.queryset
+        queryset = super().get_queryset()
 
         if title:
             queryset = queryset.filter(title__contains=title)
-        if show_themes:
-            show_themes_ids = params_to_ints(show_themes)
-            queryset = queryset.filter(show_themes__in=show_themes_ids)
+        if self.theme_filter is not None:
+            queryset = queryset.with_themes(*self.theme_filter)
+        if self.search_query is not None:
+            queryset = search_astronomy_shows(queryset, self.search_query)
 
         return queryset
 
+    @cached_property
+    def theme_membership(self):
+        return ThemeMembership.get()
+
+    @cached_property
+    def theme_filter(self):
+        """The ids of `show-themes` and whether all must match, or None"""
+        show_themes = self.request.query_params.get("show-themes")
+        if not show_themes:
+            return None
+
+        match = self.request.query_params.get("show-themes-match", "any")
+        if match not in ("any", "all"):
+            raise ValidationError(
+                {"show-themes-match": "Must be one of: any, all"}
+            )
+        return params_to_ints(show_themes), match == "all"
+
+    def listed_show_ids(self):
+        """Ids of every listed show, None when the whole catalog is"""
+        if not (
+            self.request.query_params.get("title")
+            or self.theme_filter is not None
+            or self.search_query is not None
+        ):
+            return None
+        return frozenset(
+            self.get_queryset().order_by().values_list("pk", flat=True)
+        )
+
+    @cached_property
+    def facets_requested(self):
+        facets = self.request.query_params.get("facets")
+        if self.action != "list" or not facets:
+            return False
+        if facets != "show-themes":
+            raise ValidationError({"facets": "Must be: show-themes"})
+        return True
+
+    def can_stream(self):
+        # facets wrap the list in an object
+        return super().can_stream() and not self.facets_requested
+
+    def get_version_names(self):
+        names = super().get_version_names()
+        if self.facets_requested:
+            names.append(THEME_MEMBERSHIP)
+        return names
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        if self.facets_requested and response.status_code == status.HTTP_200_OK:
+            facets = {
+                "show_themes": self.theme_membership.counts(
+                    self.listed_show_ids()
+                )
+            }
+            if isinstance(response.data, dict):
+                response.data["facets"] = facets
+            else:
+                response.data = {"results": response.data, "facets": facets}
+        return response
+
+    @property
+    def search_query(self):
+        if self.action == "list":
+            return self.request.query_params.get("search")
+        return None
+
+    @property
+    def paginator(self):
+        # the catalog is listed whole, search results are ranked pages
+        if not hasattr(self, "_paginator"):
+            self._paginator = (
+                SearchPagination() if self.search_query is not None else None
+            )
+        return self._paginator
+
     def get_serializer_class(self):
         if self.action == "list":
             return AstronomyShowListSerializer
@@ -107,6 +322,24 @@ class AstronomyShowViewSet(
             return AstronomyShowImageSerializer
         return AstronomyShowSerializer
 
+    @action(
+        methods=["GET"],
+        detail=False,
+        url_path="autocomplete",
+        # the token alone identifies the user, so no query is made
+        authentication_classes=(JWTStatelessUserAuthentication,),
+        permission_classes=(IsAuthenticated,)
+    )
+    def autocomplete(self, request):
+        """Show titles and theme names starting with `q`, from memory"""
+        try:
+            limit = min(int(request.query_params.get("limit", 10)), 50)
+        except ValueError:
+            raise ValidationError({"limit": "Must be an integer"})
+        return Response(
+            autocomplete_index.search(request.query_params.get("q", ""), limit)
+        )
+
     @action(
         methods=["POST"],
         detail=True,
@@ -124,6 +357,10 @@ class AstronomyShowViewSet(
 
 
 class ShowSessionViewSet(
+    SparseFieldsMixin,
+    QueryPlanMixin,
+    ConditionalGetMixin,
+    CachedResponseMixin,
     mixins.ListModelMixin,
     mixins.RetrieveModelMixin,
     mixins.UpdateModelMixin,
@@ -131,48 +368,184 @@ class ShowSessionViewSet(
     mixins.DestroyModelMixin,
     viewsets.GenericViewSet
 ):
-    queryset = (
-        ShowSession.objects.all()
-        .select_related("astronomy_show", "planetarium_dome")
-        .annotate(
-            tickets_available=F("planetarium_dome__rows")
-            * F("planetarium_dome__seats_in_row")
-            - Count("tickets")
-        )
+    queryset = ShowSession.objects.select_related(
+        "astronomy_show", "planetarium_dome"
     )
     serializer_class = ShowSessionSerializer
-    pagination_class = Pagination
+    pagination_class = ShowSessionPagination
 
     permission_classes = (IsAdminOrIfAuthenticatedReadOnly,)
 
+    def get_version_names(self):
+        pk = self.kwargs.get("pk", "")
+        if self.action == "retrieve" and pk.isdigit():
+            # held seats count as taken until their hold expires
+            expire_holds(int(pk))
+        return super().get_version_names()
+
     def get_queryset(self):
         date = self.request.query_params.get("date")
+        date_from = self.request.query_params.get("from")
+        date_to = self.request.query_params.get("to")
         astronomy_show = self.request.query_params.get("astronomy-show")
         planetarium_dome = self.request.query_params.get("planetarium-dome")
+        min_available = self.request.query_params.get("min-available")
+        sold_out = self.request.query_params.get("sold-out")
 
-        queryset = self.queryset
+        queryset = super().get_queryset()
 
+        # whole days become half-open show_time ranges, so the
+        # show_time indexes can be used
         if date:
-            date = datetime.strptime(date, "%Y-%m-%d").date()
-            queryset = queryset.filter(show_time__date=date)
+            date_from = date_to = date
+        try:
+            if date_from:
+                queryset = queryset.filter(
+                    show_time__gte=day_start(params_to_date(date_from))
+                )
+            if date_to:
+                queryset = queryset.filter(
+                    show_time__lt=day_start(
+                        params_to_date(date_to) + timedelta(days=1)
+                    )
+                )
+        except ValueError:
+            raise ValidationError("Dates must be in YYYY-MM-DD format")
         if astronomy_show:
             astronomy_show_id = params_to_ints(astronomy_show)
             queryset = queryset.filter(astronomy_show_id__in=astronomy_show_id)
         if planetarium_dome:
             planetarium_dome_id = params_to_ints(planetarium_dome)
             queryset = queryset.filter(planetarium_dome_id__in=planetarium_dome_id)
+        if min_available:
+            try:
+                min_available = int(min_available)
+            except ValueError:
+                raise ValidationError({"min-available": "Must be an integer"})
+            queryset = queryset.min_available(min_available)
+        if sold_out:
+            queryset = queryset.sold_out(sold_out.lower() == "true")
+
+        return queryset
 
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.action == "list":
+            fields = self.sparse_fields
+            # the keyset paginator reads show_time and id off the rows
+            queryset = ShowSessionListSerializer.values_queryset(
+                queryset, fields and fields | {"id", "show_time"}
+            )
         return queryset
 
     def get_serializer_class(self):
         if self.action == "list":
             return ShowSessionListSerializer
         if self.action == "retrieve":
+            if self.seat_map_encoding:
+                return ShowSessionSeatMapSerializer
             return ShowSessionDetailSerializer
+        if self.action == "schedule":
+            return ShowSessionScheduleSerializer
         return ShowSessionSerializer
 
+    @property
+    def seat_map_encoding(self):
+        encoding = self.request.query_params.get("seat-map")
+        if encoding and encoding not in ENCODERS:
+            raise ValidationError(
+                {"seat-map": f"Must be one of: {', '.join(ENCODERS)}"}
+            )
+        return encoding
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.action == "retrieve":
+            context["seat_map_encoding"] = self.seat_map_encoding
+        return context
+
+    def get_permissions(self):
+        if self.action == "best_available":
+            return (IsAuthenticated(),)
+        return super().get_permissions()
+
+    @action(
+        methods=["POST"],
+        detail=False,
+        url_path="schedule"
+    )
+    def schedule(self, request):
+        """Creates the sessions of a weekly recurrence, unless any overlaps"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        show_sessions = serializer.save()
+        return Response(
+            ShowSessionSerializer(show_sessions, many=True).data,
+            status=status.HTTP_201_CREATED
+        )
+
+    @action(
+        methods=["GET", "POST"],
+        detail=True,
+        url_path="best-available"
+    )
+    def best_available(self, request, pk=None):
+        """
+        Finds `count` adjacent free seats in one row, nearest to the centre.
+        POST reserves them right away.
+        """
+        show_session = self.get_object()
+        try:
+            count = int(request.query_params.get("count", 1))
+        except ValueError:
+            raise ValidationError({"count": "Must be an integer"})
+        if not 1 <= count <= show_session.planetarium_dome.seats_in_row:
+            raise ValidationError(
+                {
+                    "count": f"count must be in available range: "
+                    f"(1, {show_session.planetarium_dome.seats_in_row})"
+                }
+            )
+
+        index = FreeSeatIndex.get(show_session)
+        # a stale cached index may offer seats that were just taken,
+        # so retry once with a fresh one
+        for _ in range(2):
+            block = index.best_block(count)
+            if block is None:
+                break
+            row, seats = block
+            if request.method == "GET":
+                return Response({"row": row, "seats": seats})
+
+            serializer = ReservationSerializer(
+                data={
+                    "created_at": timezone.now(),
+                    "tickets": [
+                        {"show_session": show_session.id, "row": row, "seat": seat}
+                        for seat in seats
+                    ],
+                }
+            )
+            try:
+                serializer.is_valid(raise_exception=True)
+                serializer.save(user=request.user)
+            except ValidationError:
+                index = FreeSeatIndex.build(show_session)
+                continue
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+        return Response(
+            {"detail": f"There are no {count} adjacent free seats"},
+            status=status.HTTP_409_CONFLICT
+        )
+
 
 class ReservationViewSet(
+    SparseFieldsMixin,
+    QueryPlanMixin,
+    IdempotentCreateMixin,
+    ReservationIntakeMixin,
     mixins.ListModelMixin,
     mixins.RetrieveModelMixin,
     mixins.UpdateModelMixin,
@@ -182,18 +555,130 @@ class ReservationViewSet(
 ):
     queryset = Reservation.objects.all()
     serializer_class = ReservationSerializer
-    pagination_class = Pagination
+    pagination_class = ReservationPagination
 
     permission_classes = (IsAuthenticated,)
 
     def get_queryset(self):
-        return Reservation.objects.filter(user=self.request.user)
+        queryset = Reservation.objects.filter(user=self.request.user)
+
+        if self.action == "list":
+            queryset = queryset.prefetch_related(
+                Prefetch(
+                    "tickets__show_session",
+                    queryset=ShowSession.objects.select_related(
+                        "astronomy_show", "planetarium_dome"
+                    ).with_tickets_available()
+                )
+            )
+        return queryset
 
     def get_serializer_class(self):
         if self.action == "list":
             return ReservationListSerializer
+        if self.action == "basket":
+            return BasketSerializer
 
         return ReservationSerializer
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
+
+    @action(
+        methods=["POST"],
+        detail=False,
+        url_path="basket"
+    )
+    def basket(self, request):
+        """Reserves seats of several show sessions at once"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save(user=request.user)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+class SeatHoldViewSet(
+    SparseFieldsMixin,
+    QueryPlanMixin,
+    mixins.ListModelMixin,
+    mixins.RetrieveModelMixin,
+    mixins.CreateModelMixin,
+    mixins.DestroyModelMixin,
+    viewsets.GenericViewSet
+):
+    queryset = SeatHold.objects.all()
+    serializer_class = SeatHoldSerializer
+
+    permission_classes = (IsAuthenticated,)
+
+    def get_queryset(self):
+        queryset = SeatHold.objects.filter(
+            user=self.request.user, expires_at__gt=timezone.now()
+        ).prefetch_related("seats")
+
+        if self.action == "reserve":
+            queryset = queryset.select_for_update()
+        return queryset
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+    def perform_destroy(self, instance):
+        instance.release()
+
+    @staticmethod
+    def sold_seats(hold):
+        places = {(row, seat) for _, row, seat in hold.places()}
+        sold = Ticket.objects.filter(
+            show_session_id=hold.show_session_id,
+            row__in={row for row, _ in places},
+            seat__in={seat for _, seat in places},
+        ).values_list("row", "seat")
+        return [
+            {"row": row, "seat": seat}
+            for row, seat in sorted(places.intersection(sold))
+        ]
+
+    @action(
+        methods=["POST"],
+        detail=True,
+        url_path="reserve"
+    )
+    def reserve(self, request, pk=None):
+        """Turns the held seats into a reservation"""
+        try:
+            with transaction.atomic():
+                hold = self.get_object()
+                reservation = Reservation.objects.create(
+                    user=request.user, created_at=timezone.now()
+                )
+                hold.convert(reservation)
+        except IntegrityError:
+            # a held seat was sold by another path meanwhile
+            return Response(
+                {
+                    "detail": "Some held seats are already taken.",
+                    "seats": self.sold_seats(hold),
+                },
+                status=status.HTTP_409_CONFLICT
+            )
+
+        serializer = ReservationSerializer(reservation)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+class ReservationRequestViewSet(
+    SparseFieldsMixin,
+    QueryPlanMixin,
+    mixins.ListModelMixin,
+    mixins.RetrieveModelMixin,
+    viewsets.GenericViewSet
+):
+    queryset = ReservationRequest.objects.all()
+    serializer_class = ReservationRequestSerializer
+    pagination_class = Pagination
+
+    permission_classes = (IsAuthenticated,)
+
+    def get_queryset(self):
+        return ReservationRequest.objects.filter(user=self.request.user)
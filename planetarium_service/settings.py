@@ -94,6 +94,32 @@ DATABASES = {
     }
 }
 
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+#
+# Version stamps, cached responses and the autocomplete change counter
+# have to be seen by every process: the web server, the reservation
+# workers and the management commands. With REDIS_URL set the cache is
+# Redis, otherwise files under CACHE_LOCATION shared by the processes
+# of one host. The file-based cache increments counters by reading and
+# writing them, so use Redis once several processes change labels.
+
+if os.getenv("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.environ["REDIS_URL"],
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": os.getenv("CACHE_LOCATION", "/tmp/planetarium_cache"),
+            "OPTIONS": {"MAX_ENTRIES": 10000},
+        }
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -143,6 +169,43 @@ MEDIA_ROOT = "vol/web/media/"
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+# Seat holds
+
+SEAT_HOLD_MINUTES = 10
+SEAT_HOLD_MAX_MINUTES = 15
+
+# Seconds a booking waits for a high contention show session
+
+BOOKING_LOCK_TIMEOUT = 2
+
+# Seconds a cached show session response lives, changes drop it earlier
+
+RESPONSE_CACHE_TIMEOUT = 60
+
+# Rows read and written at a time by unpaginated lists, longer lists
+# are streamed
+
+STREAMING_LIST_CHUNK_SIZE = 500
+
+# Threads resizing uploaded show images, 0 resizes them in the request
+# after commit
+
+IMAGE_VARIANT_WORKERS = 2
+
+# Idempotency keys
+
+IDEMPOTENCY_KEY_HOURS = 24
+
+# Seat events, the in-process broker only reaches listeners of the same
+# process, point this at a shared broker when running several workers.
+# Streams are closed after SEAT_EVENTS_MAX_AGE seconds and clients
+# reconnect, the ASGI handler does not notice clients that went away.
+
+SEAT_EVENTS_BROKER = "planetarium.broadcast.InProcessBroker"
+SEAT_EVENTS_KEEPALIVE = 15
+SEAT_EVENTS_MAX_AGE = 300
+SEAT_EVENTS_QUEUE_SIZE = 100
+
 REST_FRAMEWORK = {
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
     "DEFAULT_THROTTLE_CLASSES": [
@@ -16,6 +16,7 @@ Including another URLconf
 from django.contrib import admin
 from django.conf import settings
 from django.conf.urls.static import static
+from django.contrib.staticfiles.urls import staticfiles_urlpatterns
 from django.urls import path, include
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
 
@@ -27,3 +28,6 @@ urlpatterns = [
     path("doc/", SpectacularAPIView.as_view(), name="schema"),
     path("doc/swagger/", SpectacularSwaggerView.as_view(url_name="schema"), name="swagger-ui"),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+
+# uvicorn, unlike runserver, leaves static files to the application
+urlpatterns += staticfiles_urlpatterns()